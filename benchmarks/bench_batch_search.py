@@ -0,0 +1,48 @@
+"""
+自選股批次搜尋基準測試：20 檔標的各自搜尋 vs. 一個批次指令
+用法: python benchmarks/bench_batch_search.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import warrant_engine as we  # noqa: E402
+from benchmarks.fakes import FakeShioaji, WATCHLIST  # noqa: E402
+
+
+def setup():
+    with contextlib.redirect_stdout(io.StringIO()):
+        we.load_csv_data()
+        we.api = FakeShioaji(we.SPEC_STORE)
+        we.build_contract_index()
+
+
+def run(label, fn):
+    we.api.calls = 0
+    we.api.contracts_requested = 0
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = fn()
+    elapsed = time.perf_counter() - t0
+    rows = sum(len(r) for r in results)
+    print(f"   {label:<12} 耗時 {elapsed * 1000:8.1f} ms  snapshots {we.api.calls:3d} 次 "
+          f"({we.api.contracts_requested} 檔合約)  結果 {rows} 列")
+    return results
+
+
+if __name__ == "__main__":
+    setup()
+    codes = [code for code, _, _ in WATCHLIST]
+    print(f"📏 自選股 {len(codes)} 檔 (FakeShioaji)")
+    singles = run("逐檔搜尋", lambda: [we.process_search(code) for code in codes])
+    batch = run("批次搜尋", lambda: [group[3] for group in we.process_batch_search(codes)])
+    same = all(
+        sorted(r["id"] for r in a) == sorted(r["id"] for r in b) for a, b in zip(singles, batch)
+    )
+    print(f"   結果一致: {same}")
@@ -0,0 +1,95 @@
+"""
+冷啟動 (import) 時間基準測試：每個情境開一個新的 Python 行程，量測匯入耗時與載入的模組數，
+並以 -X importtime 列出最耗時的頂層套件。
+用法: python benchmarks/bench_import_time.py [重複次數]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (名稱, 要量測的程式碼)
+SCENARIOS = [
+    ("報價引擎 (僅匯入)", "import pricing"),
+    ("報價引擎 (含首次運算)",
+     "import numpy as np, pricing\n"
+     "pricing.VectorizedEngine.implied_volatility_batch("
+     "np.array([1.0]), np.array([100.0]), np.array([100.0]), np.array([0.5]), 0.016, np.array(['call']))"),
+    ("規格庫 (僅匯入)", "import spec_store"),
+    ("warrant_engine (僅匯入)", "import warrant_engine"),
+    ("完整伺服器 (含所有相依套件)",
+     "import warrant_engine\n"
+     "for name in SERVER_DEPS:\n"
+     "    try:\n"
+     "        __import__(name)\n"
+     "    except ModuleNotFoundError:\n"
+     "        print('MISSING', name)"),
+]
+
+# 伺服器實際運作時才載入的套件 (讀規格、算 IV、連 Firebase、登入 Shioaji)
+SERVER_DEPS = ["pandas", "scipy.special", "scipy.optimize", "firebase_admin.firestore", "shioaji"]
+
+CHILD = """
+import sys, time
+SERVER_DEPS = {deps!r}
+sys.stderr.write("BENCH-START\\n")
+sys.stderr.flush()
+before = set(sys.modules)
+t0 = time.perf_counter()
+exec(compile({code!r}, "<bench>", "exec"))
+elapsed = time.perf_counter() - t0
+print(f"RESULT {{elapsed * 1000:.1f}} {{len(set(sys.modules) - before)}}")
+"""
+
+
+def measure(code):
+    """回傳 (耗時 ms, 新載入模組數, importtime 輸出, 缺少的套件)；執行失敗時耗時為 None"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(code=code, deps=SERVER_DEPS)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return None, None, proc.stderr.strip().splitlines()[-1], []
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("RESULT "))
+    missing = [l.split()[1] for l in proc.stdout.splitlines() if l.startswith("MISSING ")]
+    _, ms, modules = line.split()
+    # 只保留開始量測之後的 importtime 紀錄 (排除直譯器啟動本身)
+    log = proc.stderr.split("BENCH-START", 1)[-1]
+    return float(ms), int(modules), log, missing
+
+
+def heaviest(importtime_log, top=3):
+    """-X importtime 輸出中，頂層 (沒有縮排) 模組的累計耗時前幾名"""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("   "):   # 第一個空白是分隔用，後面還有空白代表是子模組
+            continue
+        try:
+            rows.append((int(cumulative), name.strip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return ", ".join(f"{name} {us / 1000:.0f} ms" for us, name in rows[:top])
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"📏 冷啟動匯入時間 (每項 {repeat} 次取最小值)")
+    for label, code in SCENARIOS:
+        best, modules, log = None, None, ""
+        for _ in range(repeat):
+            ms, count, out, missing = measure(code)
+            if ms is None:
+                break
+            if best is None or ms < best:
+                best, modules, log = ms, count, out
+        if best is None:
+            print(f"   {label:<24} 失敗 ({out})")
+            continue
+        print(f"   {label:<24} {best:8.1f} ms  模組 {modules:4d} 個  主要: {heaviest(log)}")
+        if missing:
+            print(f"   {'':<24} (未安裝，未計入: {', '.join(missing)})")
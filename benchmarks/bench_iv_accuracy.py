@@ -0,0 +1,99 @@
+"""
+向量化 IV 準確度檢查：implied_volatility_batch (區間 Newton + 二分法) vs. 逐檔 scipy brentq
+- q = 0：與 VectorizedEngine.implied_volatility_scalar (原本的逐檔 brentq) 比對
+- q > 0：與本檔獨立實作的含股利率 BS 價格 + brentq 比對 (同時檢查 q 項的定價)
+無解 (NaN) 的位置必須一致，有解者最大誤差需小於 TOLERANCE，否則以結束碼 1 離開。
+用法: python benchmarks/bench_iv_accuracy.py [合約數]
+"""
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.optimize import brentq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing import VectorizedEngine  # noqa: E402
+
+TOLERANCE = 1e-6
+LOW, HIGH = 0.01, 5.0
+
+
+def _cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def reference_price(sigma, S, K, T, r, q, option_type):
+    """含連續股利率 q 的 BS 價格 (純 math，不共用 pricing.py 的程式碼)"""
+    d1 = (math.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * math.sqrt(T))
+    d2 = d1 - sigma * math.sqrt(T)
+    disc_S = S * math.exp(-q * T)
+    disc_K = K * math.exp(-r * T)
+    if option_type == 'call':
+        return disc_S * _cdf(d1) - disc_K * _cdf(d2)
+    return disc_K * _cdf(-d2) - disc_S * _cdf(-d1)
+
+
+def reference_iv(price, S, K, T, r, q, option_type):
+    """與 implied_volatility_scalar 相同的規則：低於內含價值 + 0.001 或區間內無解回傳 NaN"""
+    intrinsic = max(0.0, S - K) if option_type == 'call' else max(0.0, K - S)
+    if price <= intrinsic + 0.001:
+        return np.nan
+    try:
+        return brentq(lambda s: reference_price(s, S, K, T, r, q, option_type) - price, LOW, HIGH)
+    except ValueError:
+        return np.nan
+
+
+def make_cases(n, with_q, seed=0):
+    rng = np.random.default_rng(seed)
+    S = np.full(n, 1000.0)
+    K = rng.uniform(600, 1500, n)
+    T = rng.uniform(0.01, 1.5, n)
+    r = rng.uniform(0.005, 0.03, n)
+    q = rng.uniform(0.0, 0.08, n) if with_q else np.zeros(n)
+    types = np.where(rng.random(n) < 0.6, 'call', 'put')
+    sigma = rng.uniform(0.05, 1.2, n)
+    price = np.array([reference_price(sigma[i], S[i], K[i], T[i], r[i], q[i], types[i]) for i in range(n)])
+    # 加入報價雜訊，讓部分合約低於內含價值或在區間外無解
+    price *= rng.uniform(0.9, 1.1, n)
+    return price, S, K, T, r, q, types
+
+
+def compare(label, expected, got, scalar_sec, batch_sec):
+    same_nan = np.array_equal(np.isnan(expected), np.isnan(got))
+    solved = ~np.isnan(expected)
+    max_err = float(np.max(np.abs(expected[solved] - got[solved]))) if solved.any() else 0.0
+    ok = same_nan and max_err < TOLERANCE
+    print(f"   {label:<14} {'✅' if ok else '❌'} 有解 {int(solved.sum()):5d} 檔  NaN 位置一致 {same_nan}  "
+          f"最大誤差 {max_err:.2e}  逐檔 {scalar_sec * 1000:8.1f} ms / 向量化 {batch_sec * 1000:6.1f} ms")
+    return ok
+
+
+def check(n, with_q):
+    price, S, K, T, r, q, types = make_cases(n, with_q)
+
+    t0 = time.perf_counter()
+    if with_q:
+        expected = np.array([reference_iv(price[i], S[i], K[i], T[i], r[i], q[i], types[i]) for i in range(n)])
+    else:
+        expected = np.array([
+            VectorizedEngine.implied_volatility_scalar(price[i], S[i], K[i], T[i], r[i], types[i])
+            for i in range(n)
+        ])
+    scalar_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = VectorizedEngine.implied_volatility_batch(price, S, K, T, r, types, q=q)
+    batch_sec = time.perf_counter() - t0
+
+    return compare("含股利率 q" if with_q else "q = 0", expected, got, scalar_sec, batch_sec)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    print(f"📏 IV 準確度：{n} 檔隨機合約，容許誤差 {TOLERANCE:g}")
+    results = [check(n, with_q=False), check(n, with_q=True)]
+    sys.exit(0 if all(results) else 1)
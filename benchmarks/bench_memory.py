@@ -0,0 +1,60 @@
+"""
+記憶體基準測試 (tracemalloc)：規格載入、索引建立與每次搜尋的配置量
+用法: python benchmarks/bench_memory.py [標的代碼 ...]
+"""
+import contextlib
+import gc
+import io
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import warrant_engine as we  # noqa: E402
+from benchmarks.fakes import FakeShioaji, WATCHLIST  # noqa: E402
+
+# warrant_engine 延遲載入 pandas (讀規格) 與 scipy.special (定價)；先在量測開始前匯入，
+# 避免模組本身的配置被算進「載入規格」與第一次搜尋
+import pandas  # noqa: E402,F401
+import scipy.special  # noqa: E402,F401
+
+
+def measure(label, fn):
+    """回傳 fn 執行後仍存活的配置量、執行期間峰值與配置區塊數"""
+    gc.collect()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    blocks_before = sys.getallocatedblocks()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sys.getallocatedblocks() - blocks_before
+    print(f"   {label:<14} 存活 {(current - base) / 1e6:7.2f} MB  峰值 {(peak - base) / 1e6:7.2f} MB  "
+          f"區塊 {blocks:+8d}  {elapsed * 1000:8.1f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    codes = sys.argv[1:] or [code for code, _, _ in WATCHLIST[:5]]
+    tracemalloc.start()
+    print("📏 記憶體量測 (tracemalloc，FakeShioaji)")
+    measure("載入規格", we.load_csv_data)
+    # 假 API 本身的合約與報價不計入
+    tracemalloc.stop()
+    we.api = FakeShioaji(we.SPEC_STORE, rtt=0, per_contract=0)
+    tracemalloc.start()
+    measure("建立索引", we.build_contract_index)
+    measure("交易日曆", we.get_trading_calendar)
+    for code in codes:
+        measure(f"搜尋 {code}", lambda: we.process_search(code))
+    measure("批次搜尋", lambda: we.process_batch_search(codes))
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"   峰值 RSS {rss / 1024:.1f} MB")
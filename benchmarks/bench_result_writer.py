@@ -0,0 +1,56 @@
+"""
+結果回寫基準測試：逐筆 update + 逐列 dict (舊) vs. 批次寫入 + 欄式壓縮 (新)
+用法: python benchmarks/bench_result_writer.py [指令數] [每筆結果列數]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_writer import ResultWriter, build_result_payload, encode_rows  # noqa: E402
+from benchmarks.fakes import FakeFirestore  # noqa: E402
+
+
+def make_rows(n):
+    return [{
+        "id": f"7{i:05d}",
+        "name": f"台積電元大5{i % 10}購0{i % 9 + 1}",
+        "price": 1.23, "bid": 1.22, "ask": 1.23, "spread": 0.01,
+        "bid_vol": 120, "ask_vol": 80, "volume": 3000 - i,
+        "lev": 5.43, "theta_pct": 0.812, "days": 180, "strike": 1080.0,
+        "iv": 38.5, "broker": "元大",
+    } for i in range(n)]
+
+
+def bench_legacy(n_cmds, rows):
+    store = FakeFirestore()
+    refs = [store.collection("search_commands").document(str(i)) for i in range(n_cmds)]
+    t0 = time.perf_counter()
+    for ref in refs:
+        clean = encode_rows(rows)
+        ref.update({"status": "completed", "count": len(clean), "data": clean})
+    return time.perf_counter() - t0, store
+
+
+def bench_batched(n_cmds, rows):
+    store = FakeFirestore()
+    writer = ResultWriter(store)
+    refs = [store.collection("search_commands").document(str(i)) for i in range(n_cmds)]
+    t0 = time.perf_counter()
+    for ref in refs:
+        fields, pages = build_result_payload(rows, "columnar", page_size=200, max_pages=3)
+        writer.submit(ref, fields, pages)
+    writer.flush()
+    return time.perf_counter() - t0, store
+
+
+if __name__ == "__main__":
+    n_cmds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rows = make_rows(n_rows)
+    print(f"📏 {n_cmds} 筆指令 x {n_rows} 列結果 (FakeFirestore)")
+    for label, fn in [("逐筆 update / 逐列", bench_legacy), ("批次寫入 / 欄式", bench_batched)]:
+        elapsed, store = fn(n_cmds, rows)
+        print(f"   {label:<16} 耗時 {elapsed * 1000:8.1f} ms  RPC {store.rpcs:4d} 次  "
+              f"寫入 {store.bytes / 1024:8.1f} KB  (每筆 {store.bytes / n_cmds / 1024:.1f} KB)")
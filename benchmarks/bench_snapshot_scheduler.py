@@ -0,0 +1,174 @@
+"""
+報價排程器基準測試：多個互動搜尋 + 背景掃描同時湧入一個有額度限制的 FakeShioaji
+比較「各搜尋自行呼叫 snapshots (固定 chunk、失敗盲目 sleep、Not ready 就重連)」
+與「全域排程器 (令牌桶、自適應 chunk、合併重複請求、互動優先)」
+用法: python benchmarks/bench_snapshot_scheduler.py
+"""
+import contextlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import warrant_engine as we  # noqa: E402
+from benchmarks.fakes import FakeShioaji, WATCHLIST  # noqa: E402
+from snapshot_scheduler import PRIORITY_BACKGROUND, TokenBucket  # noqa: E402
+
+# 預先排除到期合約後每次搜尋只需 1~2 次 snapshots，額度要設得夠緊才會真的觸發限流
+QUOTA = (15, 5.0)          # 券商限制：5 秒 15 次
+RECONNECT_SEC = 1.0        # 模擬一次 init_api 的代價 (實際含登出/等待約 7 秒)
+INTERACTIVE_THREADS = 6
+SEARCHES_PER_THREAD = 6
+BACKGROUND_THREADS = 2
+
+
+# ------------------------------------------
+# 舊版抓報價流程 (排程器導入前)，僅供對照
+# ------------------------------------------
+def legacy_fetch_underlying_prices(underlyings, priority=None):
+    prices = {}
+    pending = [code for code, _ in underlyings]
+    retry_count = 0
+    while pending and retry_count < 3:
+        try:
+            contracts = [c for c in (we.get_underlying_contract(code) for code in pending) if c]
+            pending = [c.code for c in contracts]
+            if not contracts:
+                break
+            for s in we.api.snapshots(contracts) or []:
+                if s.code in pending and s.close > 0:
+                    prices[s.code] = float(s.close)
+            pending = [code for code in pending if code not in prices]
+            if pending:
+                raise ValueError("Snapshot empty or invalid")
+        except Exception as e:
+            retry_count += 1
+            if "Not ready" in str(e) or "timeout" in str(e).lower():
+                we.init_api()
+                time.sleep(3)
+            else:
+                time.sleep(2)
+    return prices
+
+
+def legacy_fetch_warrant_snapshots(codes, priority=None):
+    snap_map = {}
+    gave_up = set()
+    chunk_size = 200
+    for i in range(0, len(codes), chunk_size):
+        chunk = [c for c in (we.get_stock_contract(code) for code in codes[i:i + chunk_size]) if c]
+        if not chunk:
+            continue
+        snapshots = []
+        snap_retry = 0
+        while snap_retry < 3:
+            try:
+                snapshots = we.api.snapshots(chunk)
+                break
+            except Exception as e:
+                if "Not ready" in str(e):
+                    we.init_api()
+                    time.sleep(3)
+                snap_retry += 1
+                time.sleep(1)
+        if not snapshots:
+            gave_up.update(c.code for c in chunk)
+        for s in snapshots or []:
+            snap_map[s.code] = s
+    return snap_map, gave_up
+
+
+def setup():
+    with contextlib.redirect_stdout(io.StringIO()):
+        we.load_csv_data()
+        we.api = FakeShioaji(we.SPEC_STORE)
+        we.build_contract_index()
+
+
+def reference():
+    """不限流時各互動標的的結果筆數，用來檢查限流下有沒有漏掉報價"""
+    we.api = FakeShioaji(we.SPEC_STORE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {code: len(we.process_search(code)) for code, _, _ in WATCHLIST[:10]}
+
+
+def run(label, patch, expected):
+    fake = FakeShioaji(we.SPEC_STORE, quota=QUOTA)
+    we.api = fake
+    reconnects = [0]
+
+    def fake_init_api():
+        reconnects[0] += 1
+        time.sleep(RECONNECT_SEC)
+        return True
+
+    saved = (we.fetch_underlying_prices, we.fetch_warrant_snapshots, we.init_api)
+    we.init_api = fake_init_api
+    we.snapshot_scheduler.stats = {k: 0 for k in we.snapshot_scheduler.stats}
+    # 如同正式環境，令牌桶速度設在券商額度之下 (SNAPSHOT_CONFIG["RATE"] 對應真實額度)
+    we.snapshot_scheduler.bucket = TokenBucket(QUOTA[0] / QUOTA[1], 3)
+    if patch:
+        we.fetch_underlying_prices = legacy_fetch_underlying_prices
+        we.fetch_warrant_snapshots = legacy_fetch_warrant_snapshots
+
+    interactive = [code for code, _, _ in WATCHLIST[:10]]
+    background = [code for code, _, _ in WATCHLIST[10:]]
+    latencies = []
+    rows = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def user(n):
+        for k in range(SEARCHES_PER_THREAD):
+            # 每兩個使用者同時查同一檔 (熱門標的)
+            code = interactive[(n // 2 * SEARCHES_PER_THREAD + k) % len(interactive)]
+            t0 = time.perf_counter()
+            found = we.process_search(code)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                rows.append((code, len(found)))
+
+    def scanner(n):
+        k = n
+        while not done.is_set():
+            profiles = [(we.compile_filters(None, we.STRATEGY_CONFIG), None)]
+            we.process_search_group(background[k % len(background)], profiles, PRIORITY_BACKGROUND)
+            k += BACKGROUND_THREADS
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scanners = [threading.Thread(target=scanner, args=(n,)) for n in range(BACKGROUND_THREADS)]
+        users = [threading.Thread(target=user, args=(n,)) for n in range(INTERACTIVE_THREADS)]
+        for t in scanners + users:
+            t.start()
+        for t in users:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        done.set()
+        for t in scanners:
+            t.join()
+
+    we.fetch_underlying_prices, we.fetch_warrant_snapshots, we.init_api = saved
+    wrong = sum(1 for code, n in rows if n != expected[code])
+    print(f"   {label:<8} 互動搜尋 {len(latencies)} 次  總耗時 {elapsed:6.2f} s  "
+          f"延遲 p50 {statistics.median(latencies):5.2f} s / 最大 {max(latencies):5.2f} s")
+    print(f"   {'':<8} snapshots 成功 {fake.calls:4d} 次  被限流 {fake.rejected:4d} 次  "
+          f"重連 {reconnects[0]:2d} 次  結果不完整 {wrong} 次")
+
+
+if __name__ == "__main__":
+    setup()
+    print(f"📏 FakeShioaji 額度 {QUOTA[0]} 次 / {QUOTA[1]:.0f} 秒；"
+          f"{INTERACTIVE_THREADS} 個互動使用者 x {SEARCHES_PER_THREAD} 次 + {BACKGROUND_THREADS} 個背景掃描")
+    expected = reference()
+    run("舊流程", patch=True, expected=expected)
+    run("排程器", patch=False, expected=expected)
+    s = we.snapshot_scheduler.stats
+    print(f"   排程器統計: 呼叫 {s['calls']} 次 / {s['contracts']} 檔合約，合併 {s['coalesced']} 檔，"
+          f"錯誤 {s['errors']} 次，限流等待 {s['throttle_sec']:.2f} s，chunk 最終 {we.snapshot_scheduler.chunk_size}")
@@ -0,0 +1,202 @@
+"""
+基準測試用的本機假物件 (不連網)。
+FakeFirestore 模擬每次 RPC 的往返延遲與頻寬，並記錄寫入位元組數。
+"""
+import json
+import threading
+import time
+
+
+def _size(data):
+    return len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class FakeFirestore:
+    def __init__(self, rtt=0.02, bytes_per_sec=2_000_000):
+        self.rtt = rtt
+        self.bytes_per_sec = bytes_per_sec
+        self.docs = {}
+        self.rpcs = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _rpc(self, nbytes):
+        with self._lock:
+            self.rpcs += 1
+            self.bytes += nbytes
+        time.sleep(self.rtt + nbytes / self.bytes_per_sec)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeCollection:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def document(self, doc_id):
+        return FakeDocRef(self.store, f"{self.path}/{doc_id}")
+
+
+class FakeDocRef:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.store, f"{self.path}/{name}")
+
+    def _apply(self, data, merge=True):
+        doc = self.store.docs.setdefault(self.path, {}) if merge else {}
+        doc.update(data)
+        self.store.docs[self.path] = doc
+
+    def update(self, data):
+        self.store._rpc(_size(data))
+        self._apply(data)
+
+    def set(self, data):
+        self.store._rpc(_size(data))
+        self._apply(data, merge=False)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def update(self, ref, data):
+        self.ops.append((ref, data, True))
+
+    def set(self, ref, data):
+        self.ops.append((ref, data, False))
+
+    def commit(self):
+        self.store._rpc(sum(_size(data) for _, data, _ in self.ops))
+        for ref, data, merge in self.ops:
+            ref._apply(data, merge)
+
+
+# ==========================================
+# Shioaji 假物件：報價由權證規格推算，每次 snapshots 模擬往返延遲
+# ==========================================
+WATCHLIST = [
+    ("2330", "台積電", 1350.0), ("2317", "鴻海", 240.0), ("2454", "聯發科", 1580.0),
+    ("2303", "聯電", 52.0), ("2308", "台達電", 900.0), ("3711", "日月光投控", 245.0),
+    ("2382", "廣達", 290.0), ("2412", "中華電", 130.0), ("2881", "富邦金", 93.0),
+    ("2891", "中信金", 51.0), ("3008", "大立光", 2700.0), ("2603", "長榮", 215.0),
+    ("2609", "陽明", 71.0), ("1301", "台塑", 49.0), ("2002", "中鋼", 22.0),
+    ("3034", "聯詠", 520.0), ("2379", "瑞昱", 580.0), ("3231", "緯創", 160.0),
+    ("2356", "英業達", 55.0), ("6669", "緯穎", 4000.0),
+]
+
+
+class FakeContract:
+    __slots__ = ("code", "name")
+
+    def __init__(self, code, name):
+        self.code = code
+        self.name = name
+
+
+class FakeSnapshot:
+    __slots__ = ("code", "close", "buy_price", "sell_price", "buy_volume", "sell_volume", "total_volume")
+
+    def __init__(self, code, close, bid, ask, bid_vol, ask_vol, volume):
+        self.code = code
+        self.close = close
+        self.buy_price = bid
+        self.sell_price = ask
+        self.buy_volume = bid_vol
+        self.sell_volume = ask_vol
+        self.total_volume = volume
+
+
+class FakeContractGroup(list):
+    def __init__(self, contracts=()):
+        super().__init__(contracts)
+        self._by_code = {c.code: c for c in self}
+
+    def get(self, code):
+        return self._by_code.get(code)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._by_code[key]
+        return super().__getitem__(key)
+
+
+class FakeShioaji:
+    """
+    store: 權證規格 (spec_store.SpecStore)
+    underlyings: [(代碼, 名稱, 價格), ...]
+    quota: (次數, 秒數) 滑動視窗內最多幾次 snapshots，超過時丟出 "Not ready" (模擬券商限流)
+    """
+
+    def __init__(self, store, underlyings=WATCHLIST, rtt=0.03, per_contract=0.0002, seed=7, quota=None):
+        import random
+        rng = random.Random(seed)
+        self.rtt = rtt
+        self.per_contract = per_contract
+        self.quota = quota
+        self.calls = 0
+        self.rejected = 0
+        self.contracts_requested = 0
+        self.quotes = {}
+        self._recent = []
+        self._lock = threading.Lock()
+
+        stocks = [FakeContract(code, name) for code, name, _ in underlyings]
+        for code, _, price in underlyings:
+            self.quotes[code] = FakeSnapshot(code, price, price, price, 1, 1, 1000)
+
+        warrants = []
+        specs = zip(store.codes.tolist(), store.names.tolist(), store.strike.tolist(),
+                    store.multiplier.tolist(), store.is_call.tolist())
+        for code, name, K, mul, is_call in specs:
+            warrants.append(FakeContract(code, name))
+            for _, u_name, price in underlyings:
+                if u_name in name:
+                    intrinsic = max(price - K, 0) if is_call else max(K - price, 0)
+                    ask = round((intrinsic + price * rng.uniform(0.04, 0.12)) * mul, 2)
+                    if ask > 0.01:
+                        self.quotes[code] = FakeSnapshot(
+                            code, ask, round(ask - 0.01, 2), ask,
+                            rng.randint(1, 200), rng.randint(1, 200), rng.randint(0, 5000)
+                        )
+                    break
+
+        class _NS:
+            pass
+        self.Contracts = _NS()
+        self.Contracts.Stocks = _NS()
+        self.Contracts.Stocks.TSE = FakeContractGroup(stocks + warrants)
+        self.Contracts.Stocks.OTC = FakeContractGroup()
+        self.Contracts.Indexs = _NS()
+        self.Contracts.Indexs.TSE = FakeContractGroup([FakeContract("001", "臺股指")])
+
+    def snapshots(self, contracts):
+        if self.quota:
+            limit, window = self.quota
+            with self._lock:
+                now = time.monotonic()
+                self._recent = [t for t in self._recent if now - t < window]
+                over = len(self._recent) >= limit
+                self._recent.append(now)
+                if over:
+                    self.rejected += 1
+            if over:
+                time.sleep(self.rtt)
+                raise Exception("Not ready: snapshot quota exceeded")
+        self.calls += 1
+        self.contracts_requested += len(contracts)
+        time.sleep(self.rtt + self.per_contract * len(contracts))
+        return [self.quotes[c.code] for c in contracts if c.code in self.quotes]
+
+    def logout(self):
+        pass
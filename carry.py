@@ -0,0 +1,124 @@
+import csv
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+
+from trading_calendar import parse_date, to_epoch_day
+
+# ==========================================
+# 持有成本參數 (無風險利率曲線 / 股利率 / 借券成本 / 現金股利)
+# ==========================================
+# carry_params.csv 欄位: kind, code, tenor_days, ex_date, value
+#   rate      : 無風險利率曲線，tenor_days 天期的年化利率
+#   yield     : 標的連續股利率 (ETF 配息等)
+#   borrow    : 標的借券 / 持有成本，與 yield 相加成為 q
+#   dividend  : 標的現金股利，ex_date 為除息日，value 為每股金額 (以 escrowed 模型自 S 扣除現值)
+CARRY_FILE = "carry_params.csv"
+DEFAULT_RATE = 0.016
+
+
+class CarryTable:
+    """載入後不可變；重新載入時整個換掉，搜尋中的執行緒不受影響"""
+
+    def __init__(self, rates=(), yields=None, dividends=()):
+        rates = sorted(rates) or [(365, DEFAULT_RATE)]
+        self.tenors = np.array([t for t, _ in rates], dtype=float)
+        self.rates = np.array([r for _, r in rates], dtype=float)
+
+        # 標的代碼 → 列索引，q 存成同索引的陣列
+        yields = yields or {}
+        self.codes = {code: i for i, code in enumerate(sorted(yields))}
+        self.q = np.array([yields[code] for code in sorted(yields)] + [0.0], dtype=float)
+
+        # 現金股利攤平成三條平行陣列
+        self.div_codes = np.array([code for code, _, _ in dividends], dtype=object)
+        self.div_ex = np.array([ex for _, ex, _ in dividends], dtype=np.int64)
+        self.div_amount = np.array([amt for _, _, amt in dividends], dtype=float)
+
+    def rate_for(self, T_arr):
+        """依年化期間內插利率曲線 (超出曲線兩端取端點值)"""
+        return np.interp(np.asarray(T_arr, dtype=float) * 365.0, self.tenors, self.rates)
+
+    def yield_for(self, codes):
+        """每列對應標的的 q；未設定者為 0"""
+        missing = len(self.q) - 1
+        return self.q[np.array([self.codes.get(c, missing) for c in codes], dtype=np.intp)]
+
+    def pv_dividends(self, codes, maturity_days, r_arr, today=None):
+        """每列在 (today, 到期日] 之間除息的現金股利現值"""
+        count = len(codes)
+        pv = np.zeros(count)
+        if len(self.div_amount) == 0 or count == 0:
+            return pv
+        today = to_epoch_day(today or datetime.date.today())
+        codes = np.asarray(codes, dtype=object)
+        maturity_days = np.asarray(maturity_days, dtype=np.int64)
+        live = self.div_ex > today
+        for code in set(self.div_codes[live]):
+            rows = np.flatnonzero(codes == code)
+            if len(rows) == 0:
+                continue
+            sel = live & (self.div_codes == code)
+            ex, amount = self.div_ex[sel], self.div_amount[sel]
+            t = (ex - today) / 365.0
+            hit = ex[None, :] <= maturity_days[rows, None]
+            pv[rows] = (hit * amount[None, :] * np.exp(-r_arr[rows, None] * t[None, :])).sum(axis=1)
+        return pv
+
+
+def load_carry_table(path=CARRY_FILE):
+    rates, yields, dividends = [], {}, []
+    if not os.path.exists(path):
+        print(f"⚠️ 找不到持有成本檔案 {path}，使用預設利率 {DEFAULT_RATE}")
+        return CarryTable()
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(line for line in f if not line.startswith("#")):
+            try:
+                kind = (row.get("kind") or "").strip()
+                code = (row.get("code") or "").strip()
+                value = float(row.get("value") or 0)
+                if kind == "rate":
+                    rates.append((float(row["tenor_days"]), value))
+                elif kind in ("yield", "borrow"):
+                    yields[code] = yields.get(code, 0.0) + value
+                elif kind == "dividend":
+                    dividends.append((code, to_epoch_day(parse_date(row["ex_date"])), value))
+            except (KeyError, TypeError, ValueError):
+                print(f"   ⚠️ 持有成本參數格式錯誤，略過: {row}")
+    print(f"💰 已載入持有成本參數：利率 {len(rates)} 點、q {len(yields)} 檔、現金股利 {len(dividends)} 筆")
+    return CarryTable(rates, yields, dividends)
+
+
+class CarryStore:
+    """
+    持有成本參數快取。get() 最多每 check_interval 秒檢查一次檔案修改時間，
+    檔案有更新就重新載入，不需重啟伺服器。
+    """
+
+    def __init__(self, path=CARRY_FILE, check_interval=30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._table = None
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._table is not None and now - self._checked < self.check_interval:
+            return self._table
+        with self._lock:
+            self._checked = now
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            if self._table is None or mtime != self._mtime:
+                self._table = load_carry_table(self.path)
+                self._mtime = mtime
+        return self._table
+
+    def refresh(self):
+        """強制下次 get() 重新檢查檔案"""
+        self._checked = 0.0
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import numpy as np
+
+# ==========================================
+# 結果品質診斷 (每列一個原因碼 + 反覆失敗列的預先排除)
+# ==========================================
+# 原因碼為 uint8，0 = 通過；同一列只記第一個失敗的檢查 (依運算順序)
+REASON_OK = 0
+REASON_PREFILTERED = 1      # 近期反覆沒有報價，本次不抓報價
+REASON_EXPIRY = 2           # 已到期或剩餘天數不足 (只看規格，抓報價前就能判斷)
+REASON_NO_QUOTE = 3         # snapshots 沒有回傳這檔
+REASON_BAD_QUOTE = 4        # snapshot 欄位格式錯誤
+REASON_NO_PRICE = 5         # 買賣價與成交價皆為 0
+REASON_SPREAD = 6           # 價差過大
+REASON_LOW_VOLUME = 7       # 成交量不足
+REASON_PRICE_BAND = 8       # 價格不在區間內
+REASON_BELOW_INTRINSIC = 9  # 價格不高於內含價值，IV 無意義
+REASON_IV_NO_CONVERGE = 10  # IV 在 [low, high] 內無解
+REASON_LEVERAGE = 11        # 槓桿不在區間內
+REASON_THETA = 12           # 時間價值耗損過高
+REASON_BROKER = 13          # 排除的券商
+REASON_FETCH_FAILED = 14    # 報價抓取出錯或逾時 (沒有得到券商回應，不計入沒有行情的紀錄)
+
+# 回寫給前端 / 統計用的名稱 (索引即原因碼)
+REASON_NAMES = [
+    "ok", "prefiltered", "expiry", "no_quote", "bad_quote", "no_price", "spread",
+    "low_volume", "price_band", "below_intrinsic", "iv_no_converge", "leverage", "theta", "broker",
+    "fetch_failed",
+]
+
+REASON_LABELS = [
+    "通過", "預先排除", "天數不足", "無報價", "報價錯誤", "無價格", "價差過大",
+    "量不足", "價格區間", "低於內含價值", "IV 無解", "槓桿區間", "Theta 過高", "排除券商",
+    "抓取失敗",
+]
+
+# 與使用者篩選參數無關、連續發生代表這檔暫時沒有行情的失敗
+QUOTE_FAILURES = (REASON_NO_QUOTE, REASON_BAD_QUOTE, REASON_NO_PRICE)
+
+
+def count_reasons(codes):
+    """原因碼陣列 → {名稱: 筆數} (只列出有被剔除的原因)"""
+    counts = np.bincount(np.asarray(codes, dtype=np.intp), minlength=len(REASON_NAMES))
+    return {REASON_NAMES[i]: int(n) for i, n in enumerate(counts) if i != REASON_OK and n}
+
+
+def format_reasons(counts):
+    """log 用：依筆數多到少列出中文原因"""
+    label = dict(zip(REASON_NAMES, REASON_LABELS))
+    items = sorted(counts.items(), key=lambda kv: -kv[1])
+    return "、".join(f"{label.get(name, name)} {n}" for name, n in items) or "無"
+
+
+class QuoteHealth:
+    """
+    追蹤每個規格列連續「沒有行情」的次數 (以 SpecStore 列號為索引的平行陣列)。
+    連續 fail_after 次失敗後，cooldown 秒內的搜尋不再抓這檔的報價；
+    冷卻結束後會再試一次，成功就恢復正常，失敗則再冷卻一輪。
+    同時累計各原因碼的剔除筆數，作為執行期指標。
+    """
+
+    def __init__(self, size, fail_after=3, cooldown=300.0):
+        self.fail_after = fail_after
+        self.cooldown = cooldown
+        self.failures = np.zeros(size, dtype=np.uint8)
+        self.skip_until = np.zeros(size, dtype=np.float64)
+        self.totals = np.zeros(len(REASON_NAMES), dtype=np.int64)
+        self.searches = 0     # search_underlyings 呼叫次數
+        self.profiles = 0     # 套用的篩選條件組數 (合併運算的指令各算一組)
+        self._lock = threading.Lock()
+
+    def skipped(self, rows, now=None):
+        """rows 中目前在冷卻期、應跳過抓報價的列 (布林陣列)"""
+        now = time.time() if now is None else now
+        return self.skip_until[rows] > now
+
+    def record(self, rows, codes, now=None):
+        """
+        記錄一次抓報價的結果；codes 為與 rows 等長的原因碼。
+        rows 只能包含券商有回應的列 (抓取出錯或逾時的列不應傳入)。
+        """
+        now = time.time() if now is None else now
+        failed = np.isin(codes, QUOTE_FAILURES)
+        with self._lock:
+            ok_rows = rows[~failed]
+            self.failures[ok_rows] = 0
+            self.skip_until[ok_rows] = 0.0
+            bad_rows = np.unique(rows[failed])
+            streak = np.minimum(self.failures[bad_rows].astype(np.int64) + 1, 255)
+            self.failures[bad_rows] = streak
+            self.skip_until[bad_rows] = np.where(streak >= self.fail_after, now + self.cooldown, 0.0)
+
+    def add_search(self, profiles):
+        """每次搜尋記一次，profiles 為這次合併運算的條件組數"""
+        with self._lock:
+            self.searches += 1
+            self.profiles += profiles
+
+    def add_metrics(self, codes):
+        """累計一組條件的剔除原因"""
+        counts = np.bincount(np.asarray(codes, dtype=np.intp), minlength=len(REASON_NAMES))
+        with self._lock:
+            self.totals += counts
+
+    def metrics(self):
+        """累計指標：搜尋次數、條件組數、各原因剔除筆數、目前冷卻中的列數"""
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "profiles": self.profiles,
+                "drops": {REASON_NAMES[i]: int(n) for i, n in enumerate(self.totals) if i != REASON_OK and n},
+                "cooling": int((self.skip_until > time.time()).sum()),
+            }
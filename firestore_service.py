@@ -0,0 +1,48 @@
+import os
+import threading
+
+# ==========================================
+# Firestore 連線 (第一次使用時才初始化)
+# ==========================================
+# import 本模組不會載入 firebase_admin，也不會連線；
+# 只用到報價引擎或規格庫的工具 / 基準測試不必付 Firebase 的啟動成本。
+CRED_PATH = "serviceAccountKey.json"
+
+_db = None
+_initialized = False
+_lock = threading.Lock()
+
+
+def get_db(cred_path=CRED_PATH):
+    """回傳 Firestore client；找不到金鑰或初始化失敗時回傳 None (只嘗試一次)"""
+    global _db, _initialized
+    if _initialized:
+        return _db
+    with _lock:
+        if _initialized:
+            return _db
+        _initialized = True
+        if not os.path.exists(cred_path):
+            print(f"❌ 找不到 Firebase 金鑰: {cred_path}")
+            return None
+        try:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            cred = credentials.Certificate(cred_path)
+            if not firebase_admin._apps: firebase_admin.initialize_app(cred)
+            _db = firestore.client()
+            print("✅ Firebase 連線成功")
+        except Exception as e:
+            print(f"❌ Firebase 初始化失敗: {e}")
+            _db = None
+        return _db
+
+
+def server_timestamp():
+    from firebase_admin import firestore
+    return firestore.SERVER_TIMESTAMP
+
+
+def delete_field():
+    from firebase_admin import firestore
+    return firestore.DELETE_FIELD
@@ -0,0 +1,126 @@
+import numpy as np
+
+# ==========================================
+# 金融工程核心 (向量化極速引擎)
+# ==========================================
+# 只依賴 numpy；scipy 在第一次運算時才載入 (只用到 scipy.special.ndtr，
+# 即 scipy.stats.norm.cdf 的底層實作)，單純 import 本模組不付 scipy 的啟動成本。
+_SQRT_2PI = np.sqrt(2.0 * np.pi)
+
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+class VectorizedEngine:
+    @staticmethod
+    def bs_price_scalar(sigma, S, K, T, r, option_type='call'):
+        from scipy.special import ndtr
+        try:
+            if T <= 0: return max(0, S - K) if option_type == 'call' else max(0, K - S)
+            if sigma <= 0.0001: return max(0, S - K) if option_type == 'call' else max(0, K - S)
+            d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+            d2 = d1 - sigma * np.sqrt(T)
+            if option_type == 'call':
+                return S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
+            else:
+                return K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
+        except:
+            return 0
+
+    @staticmethod
+    def implied_volatility_scalar(price, S, K, T, r, option_type='call'):
+        try:
+            intrinsic = max(0, S - K) if option_type == 'call' else max(0, K - S)
+            if price <= intrinsic + 0.001: return np.nan
+            def objective(sigma):
+                return VectorizedEngine.bs_price_scalar(sigma, S, K, T, r, option_type) - price
+            from scipy.optimize import brentq
+            return brentq(objective, 0.01, 5.0)
+        except:
+            return np.nan
+
+    @staticmethod
+    def bs_price_batch(S_arr, K_arr, T_arr, r, sigma_arr, is_call, q=0.0):
+        """向量化 BS 價格 (q 為連續股利率 / 持有成本)，同時回傳 vega (供 Newton 迭代使用)"""
+        from scipy.special import ndtr
+        sqrt_T = np.sqrt(T_arr)
+        d1 = (np.log(S_arr / K_arr) + (r - q + 0.5 * sigma_arr ** 2) * T_arr) / (sigma_arr * sqrt_T)
+        d2 = d1 - sigma_arr * sqrt_T
+        disc_S = S_arr * np.exp(-q * T_arr)
+        disc_K = K_arr * np.exp(-r * T_arr)
+        calls = disc_S * ndtr(d1) - disc_K * ndtr(d2)
+        puts = disc_K * ndtr(-d2) - disc_S * ndtr(-d1)
+        vega = disc_S * _norm_pdf(d1) * sqrt_T
+        return np.where(is_call, calls, puts), vega
+
+    @staticmethod
+    def implied_volatility_batch(price_arr, S_arr, K_arr, T_arr, r, types_arr,
+                                 low=0.01, high=5.0, tol=1e-8, max_iter=50, q=0.0):
+        """
+        向量化 IV：區間內 Newton 迭代，跳出區間時改用二分法。
+        r、q 可為純量或逐列陣列。
+        與 implied_volatility_scalar 相同規則：低於內含價值或 [low, high] 內無解者回傳 NaN。
+        """
+        count = len(price_arr)
+        is_call = types_arr == 'call'
+        intrinsic = np.where(is_call, np.maximum(S_arr - K_arr, 0), np.maximum(K_arr - S_arr, 0))
+        iv = np.full(count, np.nan)
+        idx = np.flatnonzero((price_arr > intrinsic + 0.001) & (T_arr > 0) & (S_arr > 0) & (K_arr > 0))
+        if len(idx) == 0:
+            return iv
+
+        P, S, K, T, C = price_arr[idx], S_arr[idx], K_arr[idx], T_arr[idx], is_call[idx]
+        R = np.broadcast_to(np.asarray(r, dtype=float), price_arr.shape)[idx]
+        Q = np.broadcast_to(np.asarray(q, dtype=float), price_arr.shape)[idx]
+        lo = np.full(len(idx), low)
+        hi = np.full(len(idx), high)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # BS 價格對 sigma 單調遞增，兩端同號代表區間內無解
+            f_lo = VectorizedEngine.bs_price_batch(S, K, T, R, lo, C, Q)[0] - P
+            f_hi = VectorizedEngine.bs_price_batch(S, K, T, R, hi, C, Q)[0] - P
+            bracketed = (f_lo <= 0) & (f_hi >= 0)
+
+            sigma = np.clip(np.full(len(idx), 0.3), low, high)
+            active = np.flatnonzero(bracketed)
+            for _ in range(max_iter):
+                if len(active) == 0:
+                    break
+                a = active
+                value, vega = VectorizedEngine.bs_price_batch(S[a], K[a], T[a], R[a], sigma[a], C[a], Q[a])
+                diff = value - P[a]
+                lo[a] = np.where(diff < 0, sigma[a], lo[a])
+                hi[a] = np.where(diff > 0, sigma[a], hi[a])
+                step = sigma[a] - diff / vega
+                bisect = 0.5 * (lo[a] + hi[a])
+                use_newton = np.isfinite(step) & (step > lo[a]) & (step < hi[a])
+                done = (np.abs(diff) < tol) | (hi[a] - lo[a] < tol)
+                sigma[a] = np.where(done, sigma[a], np.where(use_newton, step, bisect))
+                active = a[~done]
+
+        iv[idx] = np.where(bracketed, sigma, np.nan)
+        return iv
+
+    @staticmethod
+    def calculate_greeks_analytical_batch(S_arr, K_arr, T_arr, r, sigma_arr, types_arr, q=0.0):
+        """r、q 可為純量或逐列陣列；q = 0 時即原本的 Black-Scholes"""
+        from scipy.special import ndtr
+        sigma_arr = np.maximum(sigma_arr, 0.0001)
+        T_arr = np.maximum(T_arr, 0.00001)
+        d1 = (np.log(S_arr / K_arr) + (r - q + 0.5 * sigma_arr ** 2) * T_arr) / (sigma_arr * np.sqrt(T_arr))
+        d2 = d1 - sigma_arr * np.sqrt(T_arr)
+        pdf_d1 = _norm_pdf(d1)
+        cdf_d1 = ndtr(d1)
+        cdf_minus_d1 = ndtr(-d1)
+        cdf_minus_d2 = ndtr(-d2)
+        cdf_d2 = ndtr(d2) 
+        disc_q = np.exp(-q * T_arr)
+        delta_calls = disc_q * cdf_d1
+        delta_puts = disc_q * (cdf_d1 - 1.0)
+        deltas = np.where(types_arr == 'call', delta_calls, delta_puts)
+        term1 = -(S_arr * disc_q * sigma_arr * pdf_d1) / (2 * np.sqrt(T_arr))
+        theta_calls = term1 - r * K_arr * np.exp(-r * T_arr) * cdf_d2 + q * S_arr * disc_q * cdf_d1
+        theta_puts = term1 + r * K_arr * np.exp(-r * T_arr) * cdf_minus_d2 - q * S_arr * disc_q * cdf_minus_d1
+        thetas_annual = np.where(types_arr == 'call', theta_calls, theta_puts)
+        return deltas, thetas_annual
@@ -0,0 +1,247 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+# ==========================================
+# 搜尋結果回寫 (批次寫入 + 欄式壓縮)
+# ==========================================
+# 欄式 (columnar) 格式：每個欄位一條平行陣列，key 只出現一次
+# 前端 services/firebaseService.ts 依 schema 版本解碼
+RESULT_SCHEMA_VERSION = 1
+RESULT_COLUMNS = [
+    "id", "name", "price", "bid", "ask", "spread", "bid_vol", "ask_vol",
+    "volume", "lev", "theta_pct", "days", "strike", "iv", "broker"
+]
+
+# Firestore 單次 batch 上限為 500 筆寫入
+FIRESTORE_BATCH_LIMIT = 500
+PAGE_COLLECTION = "pages"
+
+
+def to_native(v):
+    """numpy 型別轉回 Python 原生型別 (Firestore 不吃 numpy)"""
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, np.floating):
+        return float(v)
+    return v
+
+
+def encode_rows(rows):
+    """傳統格式：每列一個 dict"""
+    return [{k: to_native(v) for k, v in row.items()} for row in rows]
+
+
+def encode_columnar(rows):
+    """欄式格式：{欄位: [值...]}，欄位順序以 RESULT_COLUMNS 為準"""
+    columns = list(RESULT_COLUMNS)
+    for row in rows:
+        for k in row:
+            if k not in columns:
+                columns.append(k)
+    return columns, {col: [to_native(row.get(col)) for row in rows] for col in columns}
+
+
+def build_result_payload(rows, fmt="columnar", page_size=0, max_pages=0):
+    """
+    將搜尋結果組成要寫回的欄位。
+    回傳 (主文件欄位, [額外分頁欄位...])；page_size=0 表示不分頁，
+    max_pages>0 時超出部分直接截斷並標記 truncated。
+    """
+    total = len(rows)
+    if page_size and page_size > 0:
+        if max_pages and max_pages > 0:
+            rows = rows[:page_size * max_pages]
+        pages = [rows[i:i + page_size] for i in range(0, len(rows), page_size)] or [[]]
+    else:
+        pages = [rows]
+
+    encoded_pages = []
+    for page_rows in pages:
+        if fmt == "columnar":
+            columns, cols = encode_columnar(page_rows)
+            encoded_pages.append({
+                "encoding": "columnar",
+                "schema": RESULT_SCHEMA_VERSION,
+                "columns": columns,
+                "cols": cols,
+                "rows": len(page_rows),
+            })
+        else:
+            encoded_pages.append({"data": encode_rows(page_rows)})
+
+    main = dict(encoded_pages[0])
+    main.update({
+        "status": "completed",
+        "count": total,
+        "pages": len(encoded_pages),
+        "truncated": sum(len(p) for p in pages) < total,
+    })
+    return main, encoded_pages[1:]
+
+
+def build_batch_payload(groups, fmt="columnar", max_rows=0, max_doc_rows=0):
+    """
+    多標的批次搜尋的回寫欄位，結果依標的分組：
+    groups: [(查詢字串, 代碼, 名稱, 結果清單[, 剔除統計]), ...]；每組最多 max_rows 列 (0 = 不限)。
+    回傳 (主文件欄位, [額外分頁欄位...])；max_doc_rows>0 時每份文件最多放這麼多列，
+    放不下的分組依序移到 pages 子集合 (單一分組不拆頁)，避免主文件超過 Firestore 1 MiB 上限。
+    """
+    pages = [{}]
+    page_rows = 0
+    order = []
+    total = 0
+    seen = set()
+    for query, code, name, rows, *extra in groups:
+        key = code or query
+        if key in seen:
+            continue
+        seen.add(key)
+        shown = rows[:max_rows] if max_rows and max_rows > 0 else rows
+        if fmt == "columnar":
+            columns, cols = encode_columnar(shown)
+            group = {"columns": columns, "cols": cols, "rows": len(shown)}
+        else:
+            group = {"data": encode_rows(shown)}
+        group.update({
+            "query": query,
+            "stock_code": code,
+            "stock_name": name,
+            "count": len(rows),
+            "truncated": len(shown) < len(rows),
+        })
+        if extra:
+            group["diagnostics"] = extra[0]
+        if max_doc_rows and max_doc_rows > 0 and pages[-1] and page_rows + len(shown) > max_doc_rows:
+            pages.append({})
+            page_rows = 0
+        pages[-1][key] = group
+        page_rows += len(shown)
+        order.append(key)
+        total += len(rows)
+
+    encoding = {"encoding": "columnar", "schema": RESULT_SCHEMA_VERSION} if fmt == "columnar" else {}
+    main = {
+        "status": "completed",
+        "count": total,
+        "order": order,
+        "groups": pages[0],
+        "pages": len(pages),
+    }
+    main.update(encoding)
+    return main, [dict(encoding, groups=page) for page in pages[1:]]
+
+
+class ResultWriter:
+    """
+    結果回寫器：把多筆已完成的搜尋指令合併成 Firestore batch 一次送出。
+    on_snapshot 只負責 submit()，實際寫入在背景執行緒進行。
+    """
+
+    def __init__(self, db, max_batch=400, linger=0.05):
+        self.db = db
+        self.max_batch = min(max_batch, FIRESTORE_BATCH_LIMIT)
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"commits": 0, "writes": 0, "docs": 0, "failures": 0, "commit_sec": 0.0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, doc_ref, fields, extra_pages=None, on_error=None):
+        """
+        排入一筆指令的回寫；同一指令的所有分頁保證落在同一個 batch。
+        on_error(e)：這筆寫入最終失敗時在回寫執行緒呼叫 (例如文件已被刪除)。
+        """
+        ops = [("update", doc_ref, fields)]
+        for n, page in enumerate(extra_pages or [], start=1):
+            ops.append(("set", doc_ref.collection(PAGE_COLLECTION).document(str(n)), page))
+        self._queue.put((ops, on_error))
+
+    def flush(self):
+        """同步送出目前佇列中的所有寫入 (關機或量測時使用)"""
+        groups = []
+        while True:
+            try:
+                groups.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._commit_groups(groups)
+
+    def _run(self):
+        while True:
+            groups = [self._queue.get()]
+            size = len(groups[0][0])
+            deadline = time.monotonic() + self.linger
+            # 短暫等待，讓同一波湧入的指令併成同一個 batch
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                groups.append(group)
+                size += len(group[0])
+            self._commit_groups(groups)
+
+    def _commit_groups(self, groups):
+        batch_groups = []
+        size = 0
+        for group in groups:
+            if batch_groups and size + len(group[0]) > self.max_batch:
+                self._commit_batch(batch_groups)
+                batch_groups, size = [], 0
+            batch_groups.append(group)
+            size += len(group[0])
+        if batch_groups:
+            self._commit_batch(batch_groups)
+
+    def _commit_batch(self, groups):
+        """
+        合併送出多筆指令；batch 為原子操作，其中一筆出錯 (例如文件已被刪除) 整批都不會寫入，
+        此時改成每筆指令各自一個 batch 重送，只有出錯的那筆會失敗。
+        """
+        if len(groups) > 1:
+            if self._commit([op for ops, _ in groups for op in ops]) is None:
+                return
+            print(f"   🔁 改為逐筆重送 {len(groups)} 筆指令...")
+        for ops, on_error in groups:
+            error = self._commit(ops)
+            if error is not None and on_error:
+                try:
+                    on_error(error)
+                except Exception as e:
+                    print(f"   ⚠️ 回寫失敗處理錯誤: {e}")
+
+    def _commit(self, ops):
+        """送出一個 batch，成功回傳 None，失敗回傳例外"""
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                batch = self.db.batch()
+                for op, ref, data in ops:
+                    if op == "update":
+                        batch.update(ref, data)
+                    else:
+                        batch.set(ref, data)
+                batch.commit()
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"   ❌ 批次上傳失敗 ({len(ops)} 筆): {e}")
+                return e
+            elapsed = time.perf_counter() - t0
+            self.stats["commits"] += 1
+            self.stats["writes"] += len(ops)
+            self.stats["docs"] += sum(1 for op, _, _ in ops if op == "update")
+            self.stats["commit_sec"] += elapsed
+            print(f"   ☁️ 成功！批次回傳 {len(ops)} 筆寫入 ({elapsed * 1000:.0f} ms)")
+            return None
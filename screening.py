@@ -0,0 +1,233 @@
+import numpy as np
+
+from diagnostics import (
+    REASON_OK, REASON_SPREAD, REASON_LOW_VOLUME, REASON_PRICE_BAND, REASON_EXPIRY,
+    REASON_LEVERAGE, REASON_THETA, REASON_BROKER,
+)
+
+# ==========================================
+# 排序 (Top-K / 多鍵排序)
+# ==========================================
+# 可排序欄位與預設方向 (desc = 大到小)
+RANK_KEYS = {
+    "volume": "desc",
+    "lev": "desc",
+    "theta_pct": "asc",
+    "spread": "asc",
+    "iv": "asc",
+    "days": "desc",
+    "price": "asc",
+    "strike": "asc",
+    "bid_vol": "desc",
+    "ask_vol": "desc",
+}
+
+# 複合分數：由多個欄位組成的衍生指標
+SCORE_KEYS = {
+    # 每 1% 時間價值耗損換到的槓桿
+    "lev_per_theta": (lambda t: t["lev"] / np.maximum(np.abs(t["theta_pct"]), 1e-6), "desc"),
+    # 價差占價格比例
+    "spread_pct": (lambda t: t["spread"] / np.maximum(t["price"], 1e-6), "asc"),
+}
+
+DEFAULT_RANKING = {"keys": [("volume", "desc")], "limit": 0}
+
+
+def parse_ranking(data):
+    """
+    從搜尋指令解析排序條件。
+    sort 可為 "lev"、"lev:asc"、["lev_per_theta", "volume"] 或 [{"key": "lev", "dir": "desc"}]；
+    limit 為回傳筆數上限 (0 = 全部)。
+    """
+    raw = data.get("sort") or data.get("sort_by")
+    if not raw:
+        keys = list(DEFAULT_RANKING["keys"])
+    else:
+        if not isinstance(raw, list):
+            raw = [raw]
+        keys = []
+        for item in raw:
+            if isinstance(item, dict):
+                key, direction = item.get("key"), item.get("dir") or item.get("direction")
+            else:
+                key, _, direction = str(item).partition(":")
+            key = str(key).strip()
+            if key in RANK_KEYS:
+                default_dir = RANK_KEYS[key]
+            elif key in SCORE_KEYS:
+                default_dir = SCORE_KEYS[key][1]
+            else:
+                print(f"   ⚠️ 忽略未知排序欄位: {key}")
+                continue
+            direction = str(direction or data.get("order") or default_dir).strip().lower()
+            if direction not in ("asc", "desc"):
+                print(f"   ⚠️ 排序方向格式錯誤，改用預設: {key}={direction}")
+                direction = default_dir
+            keys.append((key, direction))
+        if not keys:
+            keys = list(DEFAULT_RANKING["keys"])
+
+    try:
+        limit = max(int(data.get("limit") or 0), 0)
+    except (TypeError, ValueError):
+        limit = 0
+    return {"keys": keys, "limit": limit}
+
+
+def _sort_values(table, key, direction):
+    """取出排序欄位並統一成「越小越前面」，NaN 一律排最後"""
+    if key in SCORE_KEYS:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = SCORE_KEYS[key][0](table)
+    else:
+        values = table[key]
+    values = np.asarray(values, dtype=float)
+    if direction == "desc":
+        values = -values
+    return np.where(np.isnan(values), np.inf, values)
+
+
+def rank_indices(table, ranking, count):
+    """
+    回傳排序後的列索引。
+    有 limit 時先用 argpartition 依主鍵挑出前 K 名 (含邊界同分者)，
+    只對這些列做多鍵排序，避免整張表排序。
+    """
+    if count == 0:
+        return np.empty(0, dtype=np.intp)
+    ranking = ranking or DEFAULT_RANKING
+    keys = ranking["keys"]
+    limit = ranking.get("limit") or 0
+
+    values = [_sort_values(table, key, direction) for key, direction in keys]
+    primary = values[0]
+
+    if 0 < limit < count:
+        top = np.argpartition(primary, limit - 1)[:limit]
+        threshold = primary[top].max()
+        candidates = np.flatnonzero(primary <= threshold)
+    else:
+        candidates = np.arange(count)
+
+    # np.lexsort 以最後一個鍵為主鍵
+    order = np.lexsort([v[candidates] for v in reversed(values)])
+    ranked = candidates[order]
+    return ranked[:limit] if limit else ranked
+
+
+# ==========================================
+# 篩選管線 (每個指令可自帶策略參數)
+# ==========================================
+# 各參數對應的向量化條件；值為 None 代表停用該條件
+FILTER_STAGES = {
+    "MAX_SPREAD": lambda t, v: t["spread"] <= v,
+    "MIN_VOLUME": lambda t, v: t["volume"] >= v,
+    "MIN_PRICE": lambda t, v: t["price"] >= v,
+    "MAX_PRICE": lambda t, v: t["price"] <= v,
+    "MIN_DAYS_LEFT": lambda t, v: t["days"] >= v,
+    "MIN_LEVERAGE": lambda t, v: t["lev"] >= v,
+    "MAX_LEVERAGE": lambda t, v: t["lev"] <= v,
+    "MAX_THETA_PCT": lambda t, v: np.abs(t["theta_pct"]) <= v,
+}
+
+# 各條件不通過時記錄的原因碼 (見 diagnostics.py)
+FILTER_REASONS = {
+    "MAX_SPREAD": REASON_SPREAD,
+    "MIN_VOLUME": REASON_LOW_VOLUME,
+    "MIN_PRICE": REASON_PRICE_BAND,
+    "MAX_PRICE": REASON_PRICE_BAND,
+    "MIN_DAYS_LEFT": REASON_EXPIRY,
+    "MIN_LEVERAGE": REASON_LEVERAGE,
+    "MAX_LEVERAGE": REASON_LEVERAGE,
+    "MAX_THETA_PCT": REASON_THETA,
+}
+
+# 第一階段 (抓報價後、算 IV 前) 就能先套用的條件，合併多組參數時取最寬鬆者
+PREFILTER_KEYS = {
+    "MAX_SPREAD": max, "MIN_VOLUME": min, "MIN_PRICE": min,
+    "MAX_PRICE": max, "MIN_DAYS_LEFT": min,
+}
+
+PIPELINE_CACHE_SIZE = 256
+_PIPELINE_CACHE = {}
+
+
+def _broker_keywords(value):
+    if not value:
+        return ()
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(str(v) for v in value if v))
+    return (str(value),)
+
+
+def normalize_filters(overrides, defaults):
+    """合併預設 STRATEGY_CONFIG 與指令自帶參數 (key 大小寫皆可)"""
+    params = dict(defaults)
+    if overrides and not isinstance(overrides, dict):
+        print(f"   ⚠️ 忽略格式錯誤的篩選參數 (應為物件): {overrides!r}")
+        overrides = None
+    for key, value in (overrides or {}).items():
+        key = str(key).upper()
+        if key not in params:
+            print(f"   ⚠️ 忽略未知篩選參數: {key}")
+            continue
+        if key == "EXCLUDE_BROKER":
+            params[key] = value
+            continue
+        try:
+            params[key] = None if value is None else float(value)
+        except (TypeError, ValueError):
+            print(f"   ⚠️ 篩選參數格式錯誤: {key}={value}")
+    params["EXCLUDE_BROKER"] = _broker_keywords(params.get("EXCLUDE_BROKER"))
+    return params
+
+
+class FilterPipeline:
+    """編譯後的篩選管線：一串綁定好參數的向量化條件，可重複套用在任何結果表上"""
+
+    def __init__(self, params):
+        self.params = params
+        self.stages = [
+            (name, fn, params[name]) for name, fn in FILTER_STAGES.items()
+            if params.get(name) is not None
+        ]
+        self.exclude_brokers = params["EXCLUDE_BROKER"]
+
+    def reasons(self, table, count):
+        """每列的原因碼 (uint8)，0 = 全部條件通過，否則為第一個不通過的條件"""
+        codes = np.zeros(count, dtype=np.uint8)
+        for name, fn, value in self.stages:
+            codes[(codes == REASON_OK) & ~fn(table, value)] = FILTER_REASONS[name]
+        for kw in self.exclude_brokers:
+            codes[(codes == REASON_OK) & (np.char.find(table["name"], kw) >= 0)] = REASON_BROKER
+        return codes
+
+    def mask(self, table, count):
+        return self.reasons(table, count) == REASON_OK
+
+
+def compile_filters(overrides, defaults):
+    """取得 (或編譯) 篩選管線；相同參數共用同一個已編譯管線"""
+    params = normalize_filters(overrides, defaults)
+    key = tuple(sorted(params.items()))
+    pipeline = _PIPELINE_CACHE.get(key)
+    if pipeline is None:
+        if len(_PIPELINE_CACHE) >= PIPELINE_CACHE_SIZE:
+            _PIPELINE_CACHE.clear()
+        pipeline = _PIPELINE_CACHE[key] = FilterPipeline(params)
+    return pipeline
+
+
+def merge_prefilter(pipelines):
+    """多組參數共用一次運算時，第一階段只能用最寬鬆的條件"""
+    bounds = {}
+    for key, pick in PREFILTER_KEYS.items():
+        values = [p.params.get(key) for p in pipelines]
+        # 任一組停用該條件，合併後也必須停用
+        bounds[key] = None if any(v is None for v in values) else pick(values)
+    # 只有所有人都排除的券商，才能在挑選權證時就先排除
+    common = set(pipelines[0].exclude_brokers)
+    for p in pipelines[1:]:
+        common &= set(p.exclude_brokers)
+    bounds["EXCLUDE_BROKER"] = tuple(sorted(common))
+    return bounds
@@ -1,8 +1,8 @@
 
 import { initializeApp } from 'firebase/app';
-import { getFirestore, doc, onSnapshot, collection, addDoc, serverTimestamp } from 'firebase/firestore';
+import { getFirestore, doc, onSnapshot, collection, addDoc, getDocs, updateDoc, serverTimestamp } from 'firebase/firestore';
 import { FIREBASE_CONFIG } from '../constants';
-import { WarrantData } from '../types';
+import { WarrantData, SearchOptions, SearchDiagnostics } from '../types';
 
 let db: any = null;
 
@@ -16,17 +16,23 @@ try {
 }
 
 // 1. 發送搜尋指令 (Request) - Returns the Document ID
-export const sendSearchCommand = async (stockCode: string): Promise<string> => {
+export const sendSearchCommand = async (stockCode: string, options: SearchOptions = {}): Promise<string> => {
   if (!db) throw new Error("Firebase not initialized");
   
   try {
     // 嚴格遵守後端 Python 規格:
     // Collection: "search_commands"
     // Fields: stock_code, status="pending", timestamp
+    // 選填: filters (覆寫策略參數), sort (多鍵排序), limit (只回傳前 K 檔)
+    // format: 'columnar' 要求欄式壓縮結果 (未帶此欄位的舊版前端會收到逐列格式)
     const docRef = await addDoc(collection(db, "search_commands"), {
       stock_code: stockCode,
       status: 'pending',
-      timestamp: serverTimestamp() // Python 監聽此時間戳記順序
+      format: 'columnar',
+      timestamp: serverTimestamp(), // Python 監聽此時間戳記順序
+      ...(options.filters ? { filters: options.filters } : {}),
+      ...(options.sort && options.sort.length ? { sort: options.sort } : {}),
+      ...(options.limit ? { limit: options.limit } : {})
     });
     return docRef.id;
   } catch (error) {
@@ -35,102 +41,153 @@ export const sendSearchCommand = async (stockCode: string): Promise<string> => {
   }
 };
 
+// 後端欄式格式的 schema 版本 (對應 result_writer.py 的 RESULT_SCHEMA_VERSION)
+const RESULT_SCHEMA_VERSION = 1;
+
+// 將單頁結果解碼為逐列物件
+// - 舊版: data: [{id, name, ...}, ...]
+// - 欄式: encoding="columnar", columns: [...], cols: {欄位: [值...]}
+const decodeResultPage = (page: any): any[] => {
+  if (page.encoding === 'columnar') {
+    if (page.schema > RESULT_SCHEMA_VERSION) {
+      console.warn(`Unsupported result schema: ${page.schema}`);
+    }
+    const columns: string[] = page.columns || Object.keys(page.cols || {});
+    const cols = page.cols || {};
+    const rowCount = page.rows ?? (cols[columns[0]] || []).length;
+    const rows: any[] = [];
+    for (let i = 0; i < rowCount; i++) {
+      const row: any = {};
+      for (const col of columns) {
+        row[col] = cols[col] ? cols[col][i] : undefined;
+      }
+      rows.push(row);
+    }
+    return rows;
+  }
+  return Array.isArray(page.data) ? page.data : [];
+};
+
+// 結果超過單頁上限時，其餘分頁存放在 search_commands/{id}/pages/{n}
+const fetchExtraPages = async (commandId: string): Promise<any[]> => {
+  const snap = await getDocs(collection(db, "search_commands", commandId, "pages"));
+  return snap.docs
+    .sort((a, b) => Number(a.id) - Number(b.id))
+    .flatMap((d) => decodeResultPage(d.data()));
+};
+
+// 批次結果的標的分組超過單份文件上限時，其餘分組存放在 pages/{n}.groups
+const fetchExtraGroups = async (commandId: string): Promise<Record<string, any>> => {
+  const snap = await getDocs(collection(db, "search_commands", commandId, "pages"));
+  return snap.docs.reduce((groups, d) => ({ ...groups, ...(d.data().groups || {}) }), {} as Record<string, any>);
+};
+
+// 將 Python 回傳的 JSON 轉換為前端 WarrantData 格式
+// Python keys: id, name, price, volume, lev, theta_pct, days, strike, iv, broker
+// data 為指令文件 (或批次結果中的單一標的分組)，提供 stock_code / stock_name
+const toWarrantData = (item: any, data: any): WarrantData => {
+  // 簡單判斷認購/認售
+  const isCall = item.name.includes('購') || item.name.includes('CALL');
+  const type = item.type ? (item.type === 'call' ? 'CALL' : 'PUT') : (isCall ? 'CALL' : 'PUT');
+  
+  // 嘗試從 Python 資料中解析最佳一檔 (如果有提供)
+  const bestBid = Number(item.best_bid) || Number(item.bid) || Number(item.bid_price) || 0;
+  const bestAsk = Number(item.best_ask) || Number(item.ask) || Number(item.ask_price) || 0;
+  const bestBidVol = Number(item.best_bid_vol) || Number(item.bid_vol) || 0;
+  const bestAskVol = Number(item.best_ask_vol) || Number(item.ask_vol) || 0;
+
+  // ---------------------------------------------------------
+  // Logic to determine underlying name (Avoid Numbers/Codes)
+  // ---------------------------------------------------------
+  let uName = data.stock_name || data.stockName || item.stock_name || item.stockName || item.underlying_name;
+
+  // If name is missing or numeric (e.g. "2330"), try to extract from warrant name
+  if ((!uName || /^\d+$/.test(uName)) && item.name) {
+     const nameStr = String(item.name);
+     // Match prefix of non-digits (e.g., "台積電永豐" from "台積電永豐55購07")
+     const match = nameStr.match(/^(\D+)/); 
+     if (match) {
+        const prefix = match[1];
+        // Heuristic: Most broker suffixes are 2 chars (e.g., 凱基, 永豐)
+        // If prefix length >= 4 (e.g. 台積電永豐), strip last 2 chars -> 台積電
+        // This covers most cases: 
+        // 台積電(3)+永豐(2)=5 -> 台積電
+        // 鴻海(2)+富邦(2)=4 -> 鴻海
+        // 中鋼(2)+凱基(2)=4 -> 中鋼
+        if (prefix.length >= 4) {
+           uName = prefix.slice(0, -2);
+        } else {
+           // e.g. 友達 (2)? If no broker suffix? Just use prefix.
+           uName = prefix;
+        }
+     } else {
+        // Name starts with digits (e.g. 0050元大...), use full name as fallback
+        // Better to show "0050元大..." than just "0050"
+        uName = nameStr;
+     }
+  }
+
+  // Absolute fallback
+  if (!uName) uName = data.stock_code || "Unknown";
+
+  return {
+    id: item.id,
+    symbol: item.id,
+    name: item.name,
+    underlyingSymbol: data.stock_code || "Unknown",
+    underlyingName: uName,
+    broker: item.broker || "N/A", 
+    type: type,
+    
+    // 核心數據
+    price: Number(item.price) || 0,
+    strikePrice: Number(item.strike) || 0,
+    volume: Number(item.volume) || 0,
+    
+    // 欄位映射 (Python key -> Frontend key)
+    effectiveLeverage: Number(item.lev) || 0,
+    thetaPercent: Number(item.theta_pct) || 0,
+    daysToMaturity: Number(item.days) || 0,
+    impliedVolatility: Number(item.iv) || 0,
+    
+    // Order Book Data (Best 1 Gear)
+    delta: 0,
+    spreadPercent: 0,
+    bids: bestBid > 0 ? [{price: bestBid, volume: bestBidVol}] : [],
+    asks: bestAsk > 0 ? [{price: bestAsk, volume: bestAskVol}] : [],
+    bestBidPrice: bestBid,
+    bestAskPrice: bestAsk,
+    bestBidVol: bestBidVol,
+    bestAskVol: bestAskVol
+  };
+};
+
 // 2. 監聽特定指令的結果 (Response)
 // Python 後端會直接更新原本的 Command Document，將 status 改為 completed 並附上 data
 export const subscribeToSearchCommand = (
   commandId: string,
-  onData: (data: WarrantData[], updatedAt?: Date, isComplete?: boolean) => void
+  onData: (data: WarrantData[], updatedAt?: Date, isComplete?: boolean, diagnostics?: SearchDiagnostics) => void
 ) => {
   if (!db || !commandId) return () => {};
 
   const docRef = doc(db, "search_commands", commandId);
 
-  const unsubscribe = onSnapshot(docRef, (docSnap) => {
+  const unsubscribe = onSnapshot(docRef, async (docSnap) => {
     if (docSnap.exists()) {
       const data = docSnap.data();
       
       // 檢查狀態是否完成
-      if (data.status === 'completed' && Array.isArray(data.data)) {
-        const rawResults = data.data;
-        
-        // 將 Python 回傳的 JSON 轉換為前端 WarrantData 格式
-        // Python keys: id, name, price, volume, lev, theta_pct, days, strike, iv, broker
-        const warrants: WarrantData[] = rawResults.map((item: any) => {
-          // 簡單判斷認購/認售
-          const isCall = item.name.includes('購') || item.name.includes('CALL');
-          const type = item.type ? (item.type === 'call' ? 'CALL' : 'PUT') : (isCall ? 'CALL' : 'PUT');
-          
-          // 嘗試從 Python 資料中解析最佳一檔 (如果有提供)
-          const bestBid = Number(item.best_bid) || Number(item.bid) || Number(item.bid_price) || 0;
-          const bestAsk = Number(item.best_ask) || Number(item.ask) || Number(item.ask_price) || 0;
-          const bestBidVol = Number(item.best_bid_vol) || Number(item.bid_vol) || 0;
-          const bestAskVol = Number(item.best_ask_vol) || Number(item.ask_vol) || 0;
-
-          // ---------------------------------------------------------
-          // Logic to determine underlying name (Avoid Numbers/Codes)
-          // ---------------------------------------------------------
-          let uName = data.stock_name || data.stockName || item.stock_name || item.stockName || item.underlying_name;
-
-          // If name is missing or numeric (e.g. "2330"), try to extract from warrant name
-          if ((!uName || /^\d+$/.test(uName)) && item.name) {
-             const nameStr = String(item.name);
-             // Match prefix of non-digits (e.g., "台積電永豐" from "台積電永豐55購07")
-             const match = nameStr.match(/^(\D+)/); 
-             if (match) {
-                const prefix = match[1];
-                // Heuristic: Most broker suffixes are 2 chars (e.g., 凱基, 永豐)
-                // If prefix length >= 4 (e.g. 台積電永豐), strip last 2 chars -> 台積電
-                // This covers most cases: 
-                // 台積電(3)+永豐(2)=5 -> 台積電
-                // 鴻海(2)+富邦(2)=4 -> 鴻海
-                // 中鋼(2)+凱基(2)=4 -> 中鋼
-                if (prefix.length >= 4) {
-                   uName = prefix.slice(0, -2);
-                } else {
-                   // e.g. 友達 (2)? If no broker suffix? Just use prefix.
-                   uName = prefix;
-                }
-             } else {
-                // Name starts with digits (e.g. 0050元大...), use full name as fallback
-                // Better to show "0050元大..." than just "0050"
-                uName = nameStr;
-             }
+      if (data.status === 'completed' && (data.encoding === 'columnar' || Array.isArray(data.data))) {
+        let rawResults = decodeResultPage(data);
+        if (Number(data.pages) > 1) {
+          try {
+            rawResults = rawResults.concat(await fetchExtraPages(commandId));
+          } catch (error) {
+            console.error("Error fetching result pages:", error);
           }
-
-          // Absolute fallback
-          if (!uName) uName = data.stock_code || "Unknown";
-
-          return {
-            id: item.id,
-            symbol: item.id,
-            name: item.name,
-            underlyingSymbol: data.stock_code || "Unknown",
-            underlyingName: uName,
-            broker: item.broker || "N/A", 
-            type: type,
-            
-            // 核心數據
-            price: Number(item.price) || 0,
-            strikePrice: Number(item.strike) || 0,
-            volume: Number(item.volume) || 0,
-            
-            // 欄位映射 (Python key -> Frontend key)
-            effectiveLeverage: Number(item.lev) || 0,
-            thetaPercent: Number(item.theta_pct) || 0,
-            daysToMaturity: Number(item.days) || 0,
-            impliedVolatility: Number(item.iv) || 0,
-            
-            // Order Book Data (Best 1 Gear)
-            delta: 0,
-            spreadPercent: 0,
-            bids: bestBid > 0 ? [{price: bestBid, volume: bestBidVol}] : [],
-            asks: bestAsk > 0 ? [{price: bestAsk, volume: bestAskVol}] : [],
-            bestBidPrice: bestBid,
-            bestAskPrice: bestAsk,
-            bestBidVol: bestBidVol,
-            bestAskVol: bestAskVol
-          };
-        });
+        }
+        
+        const warrants: WarrantData[] = rawResults.map((item: any) => toWarrantData(item, data));
 
         // 處理最後更新時間
         let updatedAt = new Date();
@@ -138,10 +195,135 @@ export const subscribeToSearchCommand = (
             updatedAt = data.updatedAt.toDate ? data.updatedAt.toDate() : new Date(data.updatedAt);
         }
 
-        onData(warrants, updatedAt, true);
+        onData(warrants, updatedAt, true, data.diagnostics);
       }
     }
   });
 
   return unsubscribe;
 };
+
+// 3. 批次搜尋 (自選股清單)：一個指令帶多個標的，結果依標的分組
+export const sendBatchSearchCommand = async (stockCodes: string[], options: SearchOptions = {}): Promise<string> => {
+  if (!db) throw new Error("Firebase not initialized");
+
+  try {
+    const docRef = await addDoc(collection(db, "search_commands"), {
+      type: 'batch',
+      stock_codes: stockCodes,
+      status: 'pending',
+      format: 'columnar',
+      timestamp: serverTimestamp(),
+      ...(options.filters ? { filters: options.filters } : {}),
+      ...(options.sort && options.sort.length ? { sort: options.sort } : {}),
+      ...(options.limit ? { limit: options.limit } : {})
+    });
+    return docRef.id;
+  } catch (error) {
+    console.error("Error sending batch command:", error);
+    throw error;
+  }
+};
+
+// 監聽批次搜尋結果：回傳 { 標的代碼: WarrantData[] }，依送出順序排列
+export const subscribeToBatchCommand = (
+  commandId: string,
+  onData: (
+    groups: Record<string, WarrantData[]>,
+    updatedAt?: Date,
+    diagnostics?: Record<string, SearchDiagnostics>
+  ) => void
+) => {
+  if (!db || !commandId) return () => {};
+
+  const docRef = doc(db, "search_commands", commandId);
+
+  return onSnapshot(docRef, async (docSnap) => {
+    if (!docSnap.exists()) return;
+    const data = docSnap.data();
+    if (data.status !== 'completed' || !data.groups) return;
+
+    let rawGroups: Record<string, any> = data.groups;
+    if (Number(data.pages) > 1) {
+      try {
+        rawGroups = { ...rawGroups, ...(await fetchExtraGroups(commandId)) };
+      } catch (error) {
+        console.error("Error fetching batch result pages:", error);
+      }
+    }
+
+    const groups: Record<string, WarrantData[]> = {};
+    const diagnostics: Record<string, SearchDiagnostics> = {};
+    const order: string[] = data.order || Object.keys(rawGroups);
+    for (const key of order) {
+      const group = rawGroups[key];
+      if (!group) continue;
+      const page = data.encoding === 'columnar' ? { ...group, encoding: 'columnar', schema: data.schema } : group;
+      groups[key] = decodeResultPage(page).map((item: any) => toWarrantData(item, group));
+      if (group.diagnostics) diagnostics[key] = group.diagnostics;
+    }
+
+    let updatedAt = new Date();
+    if (data.updatedAt) {
+      updatedAt = data.updatedAt.toDate ? data.updatedAt.toDate() : new Date(data.updatedAt);
+    }
+    onData(groups, updatedAt, diagnostics);
+  });
+};
+
+// 4. 即時訂閱：後端在 durationSec 秒內 (或收盤前) 持續推送變動的列
+// 文件欄位: rows = { 權證代號: 列資料 }, order = 目前排名, status = live / expired / closed / cancelled
+export const sendSubscribeCommand = async (
+  stockCode: string,
+  durationSec: number,
+  options: SearchOptions = {}
+): Promise<string> => {
+  if (!db) throw new Error("Firebase not initialized");
+
+  try {
+    const docRef = await addDoc(collection(db, "search_commands"), {
+      type: 'subscribe',
+      stock_code: stockCode,
+      duration_sec: durationSec,
+      status: 'pending',
+      timestamp: serverTimestamp(),
+      ...(options.filters ? { filters: options.filters } : {}),
+      ...(options.sort && options.sort.length ? { sort: options.sort } : {}),
+      ...(options.limit ? { limit: options.limit } : {})
+    });
+    return docRef.id;
+  } catch (error) {
+    console.error("Error sending subscribe command:", error);
+    throw error;
+  }
+};
+
+export const subscribeToLiveCommand = (
+  commandId: string,
+  onData: (data: WarrantData[], updatedAt?: Date, isLive?: boolean) => void
+) => {
+  if (!db || !commandId) return () => {};
+
+  const docRef = doc(db, "search_commands", commandId);
+
+  return onSnapshot(docRef, (docSnap) => {
+    if (!docSnap.exists()) return;
+    const data = docSnap.data();
+    if (data.status === 'pending' || !data.rows) return;
+
+    const rows = data.rows as Record<string, any>;
+    const order: string[] = (data.order || Object.keys(rows)).filter((id: string) => rows[id]);
+    const warrants = order.map((id) => toWarrantData(rows[id], data));
+
+    let updatedAt = new Date();
+    if (data.updatedAt) {
+      updatedAt = data.updatedAt.toDate ? data.updatedAt.toDate() : new Date(data.updatedAt);
+    }
+    onData(warrants, updatedAt, data.status === 'live');
+  });
+};
+
+export const cancelLiveCommand = async (commandId: string) => {
+  if (!db || !commandId) return;
+  await updateDoc(doc(db, "search_commands", commandId), { status: 'cancelled' });
+};
@@ -0,0 +1,48 @@
+import time
+
+# ==========================================
+# Shioaji 連線 (登入時才載入 shioaji 套件)
+# ==========================================
+
+
+def connect(api_key, secret_key, previous=None):
+    """
+    初始化或重啟 Shioaji API (含安全等待機制)。
+    previous 為舊連線 (會先安全登出)；回傳 (api, 是否成功)。
+    """
+    print("🔄 正在執行 API 連線/重連程序...")
+
+    # 1. 嘗試安全登出舊連線
+    if previous:
+        try:
+            previous.logout()
+            time.sleep(2)
+        except Exception:
+            pass
+
+    api = previous
+    try:
+        import shioaji as sj
+
+        # 2. 建立新物件
+        api = sj.Shioaji()
+
+        # 3. 登入
+        api.login(api_key=api_key, secret_key=secret_key)
+
+        print("   ⏳ 等待連線建立 (5秒)...")
+        time.sleep(5) # 關鍵：給系統足夠時間建立 Session
+
+        # 4. 暖機測試
+        # 隨便抓一檔權值股確認連線活著
+        try:
+            api.snapshots([api.Contracts.Stocks.TSE.get('2330')])
+            print("   🩺 連線健康檢查通過")
+        except:
+            pass
+
+        print("✅ Shioaji API 連線就緒！")
+        return api, True
+    except Exception as e:
+        print(f"❌ API 連線失敗: {e}")
+        return api, False
@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ==========================================
+# 全域報價排程器 (令牌桶限流 + 自適應 chunk + 合併重複請求)
+# ==========================================
+# 所有搜尋都透過同一個排程器呼叫 api.snapshots：
+#   - 每次呼叫消耗一個令牌，避免多個搜尋同時湧入打爆券商行情額度
+#   - chunk 大小依實際延遲與錯誤率調整 (AIMD：順利就加大，變慢或出錯就縮小)
+#   - 同一檔合約已在排隊或查詢中時，後來的搜尋直接等同一筆結果
+#   - 互動搜尋 (前端指令) 優先於背景掃描 (即時訂閱推送)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# 重試用盡仍沒有回應 (錯誤 / 逾時) 的代號，與「有回應但沒有這檔」區分
+_GAVE_UP = object()
+
+# 這類錯誤代表連線或額度出問題，需要退避；連續失敗太多次才整個重連
+CONNECTION_ERRORS = ("not ready", "102949866", "timeout", "timed out")
+
+
+def is_connection_error(e):
+    msg = str(e).lower()
+    return any(key in msg for key in CONNECTION_ERRORS)
+
+
+class TokenBucket:
+    """每秒補充 rate 個令牌，最多累積 burst 個"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取得一個令牌 (必要時等待)，回傳等待秒數"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, seconds):
+        """額度疑似用盡時退避：接下來 seconds 秒不發出新的呼叫"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class _Waiter:
+    __slots__ = ("pending", "results", "event")
+
+    def __init__(self, codes):
+        self.pending = set(codes)
+        self.results = {}
+        self.event = threading.Event()
+
+
+class SnapshotScheduler:
+    """
+    snapshot_fn(contracts) -> [snapshot, ...]：實際的報價呼叫 (通常是 api.snapshots)
+    reconnect()：連續 reconnect_after 次連線錯誤後呼叫 (通常是 init_api)
+    """
+
+    def __init__(self, snapshot_fn, reconnect=None, rate=8.0, burst=10,
+                 chunk_size=200, min_chunk=50, max_chunk=500, chunk_step=50,
+                 target_latency=1.0, max_attempts=3, backoff=1.0, reconnect_after=3):
+        self.snapshot_fn = snapshot_fn
+        self.reconnect = reconnect
+        self.bucket = TokenBucket(rate, burst)
+        self.chunk_size = chunk_size
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.chunk_step = chunk_step
+        self.target_latency = target_latency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.reconnect_after = reconnect_after
+
+        self._cv = threading.Condition()
+        self._queues = {PRIORITY_INTERACTIVE: OrderedDict(), PRIORITY_BACKGROUND: OrderedDict()}
+        self._waiters = {}    # 代號 → 等待中的 _Waiter (排隊中或查詢中)
+        self._priority = {}   # 代號 → 目前最高的請求優先權
+        self._attempts = {}
+        self._failures = 0    # 連續連線錯誤次數
+        self._thread = None
+        self._stop = False
+
+        # 延遲與錯誤率以指數移動平均追蹤
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.stats = {"calls": 0, "contracts": 0, "coalesced": 0, "errors": 0,
+                      "reconnects": 0, "throttle_sec": 0.0}
+
+    def start(self):
+        with self._cv:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="snapshot-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+
+    def fetch(self, contracts, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        取得一批合約的報價，回傳 ({代號: snapshot}, 放棄的代號集合)。
+        券商有回應但沒有該檔報價的代號兩邊都不會出現；
+        放棄的代號為重試用盡仍出錯或等待逾時者 (沒有得到任何回應)。
+        與其他搜尋重疊的合約只會查詢一次。
+        """
+        by_code = {}
+        for c in contracts:
+            if c is not None:
+                by_code.setdefault(c.code, c)
+        if not by_code:
+            return {}, set()
+
+        self.start()
+        waiter = _Waiter(by_code)
+        with self._cv:
+            for code, contract in by_code.items():
+                if code in self._waiters:
+                    self._waiters[code].append(waiter)
+                    self.stats["coalesced"] += 1
+                    # 背景請求的合約被互動搜尋需要時，提升優先權 (查詢中的合約若失敗重排也適用)
+                    if priority < self._priority[code]:
+                        self._priority[code] = priority
+                        if code in self._queues[PRIORITY_BACKGROUND]:
+                            self._queues[priority][code] = self._queues[PRIORITY_BACKGROUND].pop(code)
+                else:
+                    self._waiters[code] = [waiter]
+                    self._priority[code] = priority
+                    self._queues[priority][code] = contract
+            self._cv.notify()
+
+        waiter.event.wait(timeout)
+        with self._cv:
+            results = dict(waiter.results)
+            gave_up = set(waiter.pending)
+            # 逾時：還沒拿到的代號不再等待，沒有其他人等的合約也從佇列移除
+            for code in waiter.pending:
+                self._detach(code, waiter)
+        gave_up.update(code for code, snap in results.items() if snap is _GAVE_UP)
+        snaps = {code: snap for code, snap in results.items() if snap is not None and snap is not _GAVE_UP}
+        return snaps, gave_up
+
+    def _detach(self, code, waiter):
+        waiters = self._waiters.get(code)
+        if not waiters:
+            return
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[code]
+            self._priority.pop(code, None)
+            self._attempts.pop(code, None)
+            for queue in self._queues.values():
+                queue.pop(code, None)
+
+    def _queued(self):
+        return any(self._queues.values())
+
+    def _take_chunk(self):
+        chunk = []
+        for priority in (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND):
+            queue = self._queues[priority]
+            while queue and len(chunk) < self.chunk_size:
+                chunk.append(queue.popitem(last=False))
+        return chunk
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._queued() and not self._stop:
+                    self._cv.wait()
+                if self._stop:
+                    return
+
+            # 先拿令牌再挑 chunk，等待期間新進的互動請求也能排進這一批
+            self.stats["throttle_sec"] += self.bucket.acquire()
+            with self._cv:
+                chunk = self._take_chunk()
+            if chunk:
+                self._dispatch(chunk)
+
+    def _dispatch(self, chunk):
+        contracts = [contract for _, contract in chunk]
+        t0 = time.monotonic()
+        try:
+            snaps = self.snapshot_fn(contracts) or []
+        except Exception as e:
+            self._on_error(chunk, e)
+            return
+        latency = time.monotonic() - t0
+
+        self.stats["calls"] += 1
+        self.stats["contracts"] += len(contracts)
+        self._failures = 0
+        self._adapt(latency, ok=True, full=len(chunk) >= self.chunk_size)
+
+        got = {s.code: s for s in snaps}
+        with self._cv:
+            for code, _ in chunk:
+                self._resolve(code, got.get(code))
+
+    def _on_error(self, chunk, e):
+        self.stats["errors"] += 1
+        self._adapt(None, ok=False)
+        print(f"   ⚠️ 報價抓取失敗 ({len(chunk)} 檔，chunk 調整為 {self.chunk_size}): {e}")
+
+        if is_connection_error(e):
+            self._failures += 1
+            self.bucket.penalize(self.backoff * 2 ** (self._failures - 1))
+            if self.reconnect and self._failures >= self.reconnect_after:
+                print("   🔌 連續連線錯誤，執行重連...")
+                self.stats["reconnects"] += 1
+                self._failures = 0
+                self.reconnect()
+
+        with self._cv:
+            # 未超過重試次數的合約放回原優先權佇列最前面
+            for code, contract in reversed(chunk):
+                if code not in self._waiters:
+                    continue  # 等待者都已逾時離開
+                attempts = self._attempts.get(code, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._resolve(code, _GAVE_UP)
+                else:
+                    self._attempts[code] = attempts
+                    queue = self._queues[self._priority[code]]
+                    queue[code] = contract
+                    queue.move_to_end(code, last=False)
+
+    def _resolve(self, code, snap):
+        self._attempts.pop(code, None)
+        self._priority.pop(code, None)
+        for waiter in self._waiters.pop(code, ()):
+            waiter.results[code] = snap
+            waiter.pending.discard(code)
+            if not waiter.pending:
+                waiter.event.set()
+
+    def _adapt(self, latency, ok, full=False):
+        self.error_ewma = 0.8 * self.error_ewma + 0.2 * (0.0 if ok else 1.0)
+        if not ok:
+            self.chunk_size = max(self.min_chunk, self.chunk_size // 2)
+            return
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if self.latency_ewma > self.target_latency:
+            self.chunk_size = max(self.min_chunk, int(self.chunk_size * 0.75))
+        elif full and self.error_ewma < 0.1:
+            # 只有 chunk 塞滿 (大小真的成為瓶頸) 時才加大
+            self.chunk_size = min(self.max_chunk, self.chunk_size + self.chunk_step)
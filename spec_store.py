@@ -0,0 +1,78 @@
+import numpy as np
+
+# ==========================================
+# 權證規格欄式儲存 (每檔權證 = 一個整數列號)
+# ==========================================
+# 不再為每檔權證保留 dict 或 Shioaji 合約物件；
+# 搜尋流程只傳遞列號陣列，需要報價時才依代號建立合約物件。
+DEFAULT_MATURITY = "20991231"
+
+
+class SpecStore:
+    def __init__(self, codes, names, strike, multiplier, maturity_epoch, is_call):
+        self.codes = np.asarray(codes, dtype=str)
+        self.names = np.asarray(names, dtype=str)
+        self.strike = np.asarray(strike, dtype=np.float64)
+        self.multiplier = np.asarray(multiplier, dtype=np.float64)
+        self.maturity_epoch = np.asarray(maturity_epoch, dtype=np.int32)
+        self.is_call = np.asarray(is_call, dtype=bool)
+        self.row_of = {code: i for i, code in enumerate(self.codes.tolist())}
+        # 券商端有合約 (可交易) 的列，由 build_contract_index 設定
+        self.tradable = np.zeros(len(self.codes), dtype=bool)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.row_of
+
+    def mark_tradable(self, codes):
+        tradable = np.zeros(len(self.codes), dtype=bool)
+        tradable[[self.row_of[c] for c in codes if c in self.row_of]] = True
+        self.tradable = tradable
+        return int(tradable.sum())
+
+    def find(self, keyword, exclude=()):
+        """可交易權證中名稱含 keyword 的列號，exclude 為要排除的名稱關鍵字"""
+        hit = self.tradable & (np.char.find(self.names, keyword) >= 0)
+        for kw in exclude:
+            hit &= np.char.find(self.names, kw) < 0
+        return np.flatnonzero(hit)
+
+    @classmethod
+    def empty(cls):
+        """沒有任何權證的規格庫 (讀檔失敗時使用，搜尋一律回傳空結果)"""
+        return cls([], [], [], [], [], [])
+
+    @classmethod
+    def load_csv(cls, filename):
+        """讀取 warrant_full_data.csv (全部欄位向量化處理)；pandas 只在這裡用到，讀檔時才載入"""
+        import pandas as pd
+
+        df = pd.read_csv(filename, dtype=str)
+        df['權證代號'] = df['權證代號'].astype(str).str.strip()
+        df = df.drop_duplicates(subset='權證代號', keep='last')
+
+        strike = pd.to_numeric(df['履約價格'].str.replace(',', ''), errors='coerce')
+        multiplier = pd.to_numeric(df['行使比例'].str.replace(',', ''), errors='coerce')
+        names = df['權證簡稱'].astype(str)
+
+        # 民國年 (7 碼) 轉西元；其他長度視為無到期日
+        raw = df['到期日'].astype(str).str.strip()
+        roc = raw.str.len() == 7
+        raw = raw.where(~roc, (pd.to_numeric(raw.str[:3], errors='coerce') + 1911).astype('Int64').astype(str) + raw.str[3:])
+        raw = raw.where(raw.str.len() == 8, DEFAULT_MATURITY)
+        dates = pd.to_datetime(raw, format="%Y%m%d", errors='coerce')
+
+        # 到期日格式錯誤，無法計算剩餘期間
+        valid = dates.notna().to_numpy()
+        epoch = dates.to_numpy()[valid].astype('datetime64[D]').astype(np.int64)
+
+        return cls(
+            codes=df['權證代號'].to_numpy()[valid],
+            names=names.to_numpy()[valid],
+            strike=strike.to_numpy()[valid],
+            multiplier=multiplier.to_numpy()[valid],
+            maturity_epoch=epoch,
+            is_call=~names.str.contains('售').to_numpy()[valid],
+        )
@@ -0,0 +1,186 @@
+import threading
+import time
+
+from result_writer import encode_rows
+
+# ==========================================
+# 即時推播訂閱 (伺服器端維持畫面，只推送變動的列)
+# ==========================================
+# 文件格式：rows 為 {權證代號: 列資料}，更新時用欄位路徑 rows.<id> 只改變動的列，
+# 消失的列以 DELETE_FIELD 刪除；order 為目前排名 (有變才寫)。
+STATUS_LIVE = "live"
+STATUS_EXPIRED = "expired"
+STATUS_CLOSED = "closed"
+STATUS_CANCELLED = "cancelled"
+
+# 寫入失敗訊息含這些字樣代表訂閱文件已被刪除 (google.api_core.exceptions.NotFound)
+MISSING_DOCUMENT_ERRORS = ("404", "not found", "no document to update")
+
+
+def is_missing_document(e):
+    msg = str(e).lower()
+    return type(e).__name__ == "NotFound" or any(key in msg for key in MISSING_DOCUMENT_ERRORS)
+
+
+class Subscription:
+    __slots__ = ("doc_id", "doc_ref", "key", "query", "pipeline", "ranking",
+                 "expires_at", "last_rows", "last_order", "seq", "resync")
+
+    def __init__(self, doc_id, doc_ref, key, query, pipeline, ranking, expires_at):
+        self.doc_id = doc_id
+        self.doc_ref = doc_ref
+        self.key = key
+        self.query = query
+        self.pipeline = pipeline
+        self.ranking = ranking
+        self.expires_at = expires_at
+        self.last_rows = {}
+        self.last_order = []
+        self.seq = 0
+        self.resync = True    # 下次推送完整畫面 (新訂閱或上次寫入失敗)
+
+
+class SubscriptionManager:
+    """
+    管理所有即時訂閱。同一標的的訂閱者在同一個 tick 合併成一次運算
+    (search_group 即 process_search_group)，再各自算出差異寫回。
+    到期或收盤 (is_market_open 回傳 False) 時自動結束訂閱。
+    """
+
+    def __init__(self, writer, search_group, resolve, is_market_open,
+                 delete_field, timestamp, push_interval=3.0, tick=0.5):
+        self.writer = writer
+        self.search_group = search_group
+        self.resolve = resolve
+        self.is_market_open = is_market_open
+        self.delete_field = delete_field
+        self.timestamp = timestamp
+        self.push_interval = push_interval
+        self.tick = tick
+        self._subs = {}
+        self._next_due = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="subscriptions", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for sub in self._drain():
+            self._close(sub, STATUS_CLOSED)
+
+    def add(self, doc_id, doc_ref, query, pipeline, ranking, duration):
+        key = self.resolve(query) or query
+        sub = Subscription(doc_id, doc_ref, key, query, pipeline, ranking, time.time() + duration)
+        with self._lock:
+            self._subs[doc_id] = sub
+            # 新訂閱者加入時立即推送一次完整畫面
+            self._next_due[key] = 0
+        print(f"   📡 新增即時訂閱 {query} ({duration:.0f} 秒，Doc ID: {doc_id})")
+
+    def remove(self, doc_id, status=STATUS_CANCELLED):
+        """結束訂閱；status 為 None 時不回寫 (訂閱文件已被刪除)"""
+        with self._lock:
+            sub = self._subs.pop(doc_id, None)
+        if not sub:
+            return
+        if status is None:
+            print(f"   📴 即時訂閱文件已刪除 {sub.query} (Doc ID: {doc_id})")
+        else:
+            self._close(sub, status)
+
+    def _drain(self):
+        with self._lock:
+            subs = list(self._subs.values())
+            self._subs.clear()
+        return subs
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.tick_once()
+            except Exception as e:
+                print(f"\n❌ 即時訂閱迴圈錯誤: {e}")
+
+    def tick_once(self, now=None):
+        now = time.time() if now is None else now
+        is_open, _ = self.is_market_open()
+
+        with self._lock:
+            if not is_open:
+                ended = list(self._subs.values())
+                self._subs.clear()
+            else:
+                ended = [s for s in self._subs.values() if s.expires_at <= now]
+                for s in ended:
+                    del self._subs[s.doc_id]
+            groups = {}
+            for s in self._subs.values():
+                groups.setdefault(s.key, []).append(s)
+            due = [key for key in groups if self._next_due.get(key, 0) <= now]
+            for key in due:
+                self._next_due[key] = now + self.push_interval
+            for key in list(self._next_due):
+                if key not in groups:
+                    del self._next_due[key]
+
+        for s in ended:
+            self._close(s, STATUS_EXPIRED if is_open else STATUS_CLOSED)
+
+        for key in due:
+            subs = groups[key]
+            results = self.search_group(key, [(s.pipeline, s.ranking) for s in subs])
+            for s, rows in zip(subs, results):
+                self._push(s, rows)
+
+    def _push(self, sub, rows):
+        # 運算期間訂閱可能已被取消
+        if sub.doc_id not in self._subs:
+            return
+        current = {row["id"]: row for row in encode_rows(rows)}
+        order = list(current)
+        fields = {}
+        if sub.resync:
+            fields.update({"status": STATUS_LIVE, "rows": current, "order": order,
+                           "expiresAt": sub.expires_at})
+            sub.resync = False
+        else:
+            for wid, row in current.items():
+                if sub.last_rows.get(wid) != row:
+                    fields[f"rows.{wid}"] = row
+            for wid in sub.last_rows:
+                if wid not in current:
+                    fields[f"rows.{wid}"] = self.delete_field
+            if order != sub.last_order:
+                fields["order"] = order
+            if not fields:
+                return
+
+        sub.seq += 1
+        sub.last_rows = current
+        sub.last_order = order
+        fields.update({"seq": sub.seq, "count": len(current), "updatedAt": self.timestamp})
+        self.writer.submit(sub.doc_ref, fields, on_error=lambda e: self._write_failed(sub, e))
+
+    def _write_failed(self, sub, error):
+        """
+        差異推送失敗時 last_rows 已與文件內容不符：文件被刪除就結束訂閱，
+        否則下次改推完整畫面，覆蓋掉期間可能套用在舊內容上的差異。
+        """
+        if is_missing_document(error):
+            with self._lock:
+                if self._subs.get(sub.doc_id) is sub:
+                    del self._subs[sub.doc_id]
+            print(f"   📴 即時訂閱文件不存在，結束訂閱 {sub.query} (Doc ID: {sub.doc_id})")
+            return
+        sub.resync = True
+
+    def _close(self, sub, status):
+        self.writer.submit(sub.doc_ref, {"status": status, "updatedAt": self.timestamp})
+        print(f"   📴 即時訂閱結束 {sub.query} ({status}，Doc ID: {sub.doc_id})")
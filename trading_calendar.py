@@ -0,0 +1,98 @@
+import csv
+import datetime
+import os
+
+import numpy as np
+
+# ==========================================
+# 交易日曆 (台股休市日 + 週末)
+# ==========================================
+# 剩餘期間一律以「交易日」計算：T = 剩餘交易日 / 252，
+# 年化 theta / 252 即為每個交易日的 theta，兩者單位一致。
+TRADING_DAYS_PER_YEAR = 252
+HOLIDAY_FILE = "tw_holidays.csv"
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def to_epoch_day(d):
+    """日期轉成自 1970-01-01 起算的天數 (int)"""
+    return (d - EPOCH).days
+
+
+def parse_date(text):
+    text = str(text).strip().replace("/", "-")
+    if len(text) == 8 and text.isdigit():
+        text = f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    return datetime.date.fromisoformat(text)
+
+
+class TradingCalendar:
+    """
+    預先建好 [start, start + years 年) 的交易日累計表，
+    之後任何「到期日 → 剩餘交易日 / 年化期間」都是一次陣列查表。
+    超出表格範圍的日期以 252/365 比例外推。
+    """
+
+    def __init__(self, holidays=(), start=None, years=12):
+        if start is None:
+            start = datetime.date(datetime.date.today().year - 1, 1, 1)
+        self.start = to_epoch_day(start)
+        self.size = 366 * years
+        days = np.arange(self.start, self.start + self.size)
+        # 1970-01-01 為星期四 (Monday = 0)
+        weekday = (days + 3) % 7
+        self.holidays = np.array(sorted({to_epoch_day(h) for h in holidays}), dtype=np.int64)
+        self.is_trading = (weekday < 5) & ~np.isin(days, self.holidays)
+        # cum[i] = [start, start + i) 之間的交易日數
+        self.cum = np.concatenate([[0], np.cumsum(self.is_trading)])
+        self._today = None
+        self._remaining = None
+
+    def is_trading_day(self, date=None):
+        day = to_epoch_day(date or datetime.date.today())
+        i = day - self.start
+        if 0 <= i < self.size:
+            return bool(self.is_trading[i])
+        return (day + 3) % 7 < 5
+
+    def _remaining_table(self, today):
+        """到期日 (表格索引) → (today, 到期日] 之間的交易日數；每天只建一次"""
+        if self._today != today:
+            i = min(max(today - self.start + 1, 0), self.size)
+            self._remaining = self.cum[1:] - self.cum[i]
+            self._today = today
+        return self._remaining
+
+    def time_to_maturity(self, maturity_days, today=None):
+        """
+        maturity_days: 到期日 epoch-day 陣列。
+        回傳 (剩餘交易日, 年化期間 T)，皆為 float 陣列，已過期者為 0。
+        """
+        today = to_epoch_day(today or datetime.date.today())
+        maturity_days = np.asarray(maturity_days, dtype=np.int64)
+        table = self._remaining_table(today)
+        idx = np.clip(maturity_days - self.start, 0, self.size - 1)
+        trading_days = table[idx].astype(float)
+        beyond = np.maximum(maturity_days - (self.start + self.size - 1), 0)
+        trading_days += beyond * (TRADING_DAYS_PER_YEAR / 365.0)
+        trading_days = np.maximum(trading_days, 0)
+        return trading_days, trading_days / TRADING_DAYS_PER_YEAR
+
+
+def load_trading_calendar(path=HOLIDAY_FILE):
+    """讀取休市日檔案 (每行一個日期，# 開頭為註解)；找不到檔案時只排除週末"""
+    holidays = []
+    if not os.path.exists(path):
+        print(f"⚠️ 找不到休市日檔案 {path}，僅排除週末")
+        return TradingCalendar(holidays)
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                holidays.append(parse_date(row[0]))
+            except ValueError:
+                continue  # 標題列或格式錯誤
+    print(f"📅 已載入 {len(holidays)} 個休市日 ({path})")
+    return TradingCalendar(holidays)
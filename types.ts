@@ -38,3 +38,39 @@ export interface WarrantData {
   bids: OrderBookEntry[];
   asks: OrderBookEntry[];
 }
+
+// 後端排序選項 (對應 screening.py 的 RANK_KEYS / SCORE_KEYS)
+export type RankKey =
+  | 'volume' | 'lev' | 'theta_pct' | 'spread' | 'iv' | 'days' | 'price' | 'strike'
+  | 'bid_vol' | 'ask_vol' | 'lev_per_theta' | 'spread_pct';
+
+// 每個指令可覆寫的策略參數 (對應 warrant_engine.py 的 STRATEGY_CONFIG，null = 停用該條件)
+export interface StrategyFilters {
+  EXCLUDE_BROKER: string | string[];
+  MIN_DAYS_LEFT: number | null;
+  MIN_LEVERAGE: number | null;
+  MAX_LEVERAGE: number | null;
+  MAX_THETA_PCT: number | null;
+  MIN_VOLUME: number | null;
+  MIN_PRICE: number | null;
+  MAX_PRICE: number | null;
+  MAX_SPREAD: number | null;
+}
+
+// 每次搜尋的剔除統計 (對應 diagnostics.py 的 REASON_NAMES)
+export type DropReason =
+  | 'prefiltered' | 'expiry' | 'no_quote' | 'bad_quote' | 'no_price' | 'spread' | 'low_volume'
+  | 'price_band' | 'below_intrinsic' | 'iv_no_converge' | 'leverage' | 'theta' | 'broker'
+  | 'fetch_failed';
+
+export interface SearchDiagnostics {
+  scanned: number;  // 名稱符合的候選權證數
+  matched: number;  // 通過所有條件的筆數
+  drops: Partial<Record<DropReason, number>>;
+}
+
+export interface SearchOptions {
+  filters?: Partial<StrategyFilters>;
+  sort?: { key: RankKey; dir?: 'asc' | 'desc' }[];
+  limit?: number; // 0 或未指定 = 全部
+}
@@ -2,21 +2,27 @@ import sys
 import os
 import time
 import datetime
-import math
-import requests
-import pandas as pd
 import numpy as np
-from scipy.stats import norm
-from scipy.optimize import brentq
-import firebase_admin
-import shioaji as sj
-from firebase_admin import credentials, firestore
-import threading
+import firestore_service
+import shioaji_session
+from pricing import VectorizedEngine
+from result_writer import ResultWriter, build_result_payload, build_batch_payload
+from subscriptions import SubscriptionManager
+from carry import CarryStore
+from spec_store import SpecStore
+from snapshot_scheduler import SnapshotScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from trading_calendar import load_trading_calendar, to_epoch_day, TRADING_DAYS_PER_YEAR
+from screening import parse_ranking, rank_indices, compile_filters, merge_prefilter
+from diagnostics import (
+    QuoteHealth, count_reasons, format_reasons, REASON_OK, REASON_PREFILTERED, REASON_EXPIRY,
+    REASON_NO_QUOTE, REASON_BAD_QUOTE, REASON_NO_PRICE, REASON_SPREAD, REASON_LOW_VOLUME,
+    REASON_PRICE_BAND, REASON_BELOW_INTRINSIC, REASON_IV_NO_CONVERGE, REASON_FETCH_FAILED,
+)
 
 # ==========================================
 # 設定區
 # ==========================================
-CRED_PATH = "serviceAccountKey.json" 
+CRED_PATH = firestore_service.CRED_PATH
 COMMAND_COLLECTION = "search_commands" 
 
 # ⚠️ 資安提醒：正式上線建議將 Key 移至環境變數
@@ -38,6 +44,51 @@ STRATEGY_CONFIG = {
     "MAX_SPREAD": 0.05         
 }
 
+# ==========================================
+# 結果回寫設定
+# ==========================================
+RESULT_CONFIG = {
+    "FORMAT": "rows",          # 指令未指定 format 時的格式：rows (逐列，舊版前端可讀) / columnar (欄式壓縮)
+    "PAGE_SIZE": 200,          # 每份文件最多幾列，超過寫入 pages 子集合 (僅欄式格式)
+    "MAX_PAGES": 3,            # 最多幾頁，超過截斷 (0 = 不限)
+    "BATCH_DOC_ROWS": 1000,    # 批次搜尋每份文件最多幾列，超過的標的分組移到 pages 子集合 (文件上限 1 MiB)
+    "BATCH_MAX": 400,          # 單次 batch 最多寫入筆數
+    "FLUSH_LINGER": 0.05       # 等待合併批次的秒數
+}
+
+# ==========================================
+# 即時推播訂閱設定
+# ==========================================
+SUBSCRIPTION_CONFIG = {
+    "PUSH_INTERVAL": 3.0,      # 同一標的最快幾秒推送一次
+    "DEFAULT_DURATION": 600,   # 未指定時的訂閱秒數
+    "MAX_DURATION": 4 * 3600   # 單一訂閱最長秒數
+}
+
+# ==========================================
+# 報價排程設定 (所有搜尋共用同一個 snapshots 額度)
+# ==========================================
+SNAPSHOT_CONFIG = {
+    "RATE": 8.0,               # 每秒最多幾次 snapshots 呼叫 (令牌補充速度)
+    "BURST": 10,               # 令牌桶容量 (瞬間最多連發幾次)
+    "CHUNK_SIZE": 200,         # 初始每次查詢合約數
+    "MIN_CHUNK": 50,
+    "MAX_CHUNK": 500,          # Shioaji 單次 snapshots 上限
+    "TARGET_LATENCY": 1.0,     # 單次呼叫超過此秒數就縮小 chunk
+    "MAX_ATTEMPTS": 3,         # 同一檔合約最多嘗試次數
+    "RECONNECT_AFTER": 3,      # 連續幾次連線錯誤才重連 API
+    "FETCH_TIMEOUT": 60        # 單次搜尋等待報價的上限秒數
+}
+
+# ==========================================
+# 結果品質診斷設定
+# ==========================================
+QUALITY_CONFIG = {
+    "PREFILTER_AFTER": 3,      # 連續幾次沒有行情後，暫時不再抓這檔報價
+    "PREFILTER_COOLDOWN": 300, # 暫停抓報價的秒數 (之後會再試一次)
+    "METRICS_INTERVAL": 300    # 開盤中每隔幾秒輸出一次累計剔除統計
+}
+
 # 特殊名稱強制對應表
 CUSTOM_SEARCH_MAPPING = {
     "0050": "台灣50",     
@@ -61,161 +112,75 @@ KNOWN_BROKERS = [
     "國票", "永昌", "亞東"
 ]
 
-print("⚡ 正在啟動權證戰情室 (v2025.12.31 智慧排程版)...")
-
 # ==========================================
 # 1. 初始化與全域變數
 # ==========================================
-CACHE_SPECS = {} 
+SPEC_STORE = None  # 權證規格欄式儲存 (SpecStore)
+QUOTE_HEALTH = None  # 各列連續沒有行情的紀錄 (QuoteHealth，與 SPEC_STORE 同列號)
 api = None 
 STOCK_CODE_TO_NAME = {}
 STOCK_NAME_TO_CODE = {}
-ALL_WARRANTS = []
+TRADING_CALENDAR = None
+CARRY_STORE = CarryStore()
+
+snapshot_scheduler = SnapshotScheduler(
+    lambda contracts: api.snapshots(contracts),
+    reconnect=lambda: init_api(),
+    rate=SNAPSHOT_CONFIG["RATE"],
+    burst=SNAPSHOT_CONFIG["BURST"],
+    chunk_size=SNAPSHOT_CONFIG["CHUNK_SIZE"],
+    min_chunk=SNAPSHOT_CONFIG["MIN_CHUNK"],
+    max_chunk=SNAPSHOT_CONFIG["MAX_CHUNK"],
+    target_latency=SNAPSHOT_CONFIG["TARGET_LATENCY"],
+    max_attempts=SNAPSHOT_CONFIG["MAX_ATTEMPTS"],
+    reconnect_after=SNAPSHOT_CONFIG["RECONNECT_AFTER"]
+)
+
+def get_trading_calendar():
+    """交易日曆 (第一次使用時才讀取休市日檔案)"""
+    global TRADING_CALENDAR
+    if TRADING_CALENDAR is None:
+        TRADING_CALENDAR = load_trading_calendar()
+    return TRADING_CALENDAR
 
 # ==========================================
 # API 管理區 (強化版)
 # ==========================================
 def init_api():
-    """初始化或重啟 Shioaji API (含安全等待機制)"""
+    """初始化或重啟 Shioaji API (連線細節見 shioaji_session.py)"""
     global api
-    print("🔄 正在執行 API 連線/重連程序...")
-    
-    # 1. 嘗試安全登出舊連線
-    if api:
-        try:
-            api.logout()
-            time.sleep(2) 
-        except Exception:
-            pass
-    
-    try:
-        # 2. 建立新物件
-        api = sj.Shioaji()
-        
-        # 3. 登入
-        api.login(api_key=SJ_API_KEY, secret_key=SJ_SECRET_KEY)
-        
-        print("   ⏳ 等待連線建立 (5秒)...")
-        time.sleep(5) # 關鍵：給系統足夠時間建立 Session
-        
-        # 4. 暖機測試
-        # 隨便抓一檔權值股確認連線活著
-        try:
-            api.snapshots([api.Contracts.Stocks.TSE.get('2330')])
-            print("   🩺 連線健康檢查通過")
-        except:
-            pass
-
-        print("✅ Shioaji API 連線就緒！")
-        return True
-    except Exception as e:
-        print(f"❌ API 連線失敗: {e}")
-        return False
+    api, ok = shioaji_session.connect(SJ_API_KEY, SJ_SECRET_KEY, previous=api)
+    return ok
 
 def load_csv_data():
+    global SPEC_STORE, QUOTE_HEALTH
     filename = "warrant_full_data.csv"
     print(f"📂 正在讀取靜態資料庫: {filename} ...")
-    
+
+    # 讀檔失敗時改用空的規格庫，索引建立與搜尋照常運作 (只是沒有結果)
+    store = SpecStore.empty()
     if not os.path.exists(filename):
         print(f"❌ 錯誤：找不到 {filename}，請先執行 crawler.py")
-        return
+    else:
+        try:
+            store = SpecStore.load_csv(filename)
+            print(f"✅ 成功載入 {len(store)} 檔權證詳細規格！")
+        except Exception as e:
+            print(f"❌ 讀取 CSV 發生錯誤: {e}")
 
-    try:
-        df = pd.read_csv(filename, dtype=str)
-        df['履約價格'] = pd.to_numeric(df['履約價格'].str.replace(',', ''), errors='coerce')
-        df['行使比例'] = pd.to_numeric(df['行使比例'].str.replace(',', ''), errors='coerce')
-        
-        count = 0
-        for _, row in df.iterrows():
-            code = str(row['權證代號']).strip()
-            w_type = 'call'
-            name = str(row['權證簡稱'])
-            if '售' in name: w_type = 'put'
-            elif '購' in name: w_type = 'call'
-            
-            raw_date = str(row['到期日']).strip()
-            if len(raw_date) == 7:
-                raw_date = str(int(raw_date[:3]) + 1911) + raw_date[3:]
-            
-            fmt_date = "2099-12-31"
-            if len(raw_date) == 8:
-                fmt_date = f"{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:]}"
-
-            CACHE_SPECS[code] = {
-                "strike_price": float(row['履約價格']),
-                "multiplier": float(row['行使比例']),
-                "maturity_date": fmt_date,
-                "type": w_type,
-                "name": name
-            }
-            count += 1
-            
-        print(f"✅ 成功載入 {count} 檔權證詳細規格！")
-    except Exception as e:
-        print(f"❌ 讀取 CSV 發生錯誤: {e}")
-
-# 初始化 Firebase
-if not os.path.exists(CRED_PATH):
-    print(f"❌ 找不到 Firebase 金鑰: {CRED_PATH}")
-    db = None
-else:
-    try:
-        cred = credentials.Certificate(CRED_PATH)
-        if not firebase_admin._apps: firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        print("✅ Firebase 連線成功")
-    except Exception as e:
-        print(f"❌ Firebase 初始化失敗: {e}")
-        db = None
+    SPEC_STORE = store
+    QUOTE_HEALTH = QuoteHealth(
+        len(store), QUALITY_CONFIG["PREFILTER_AFTER"], QUALITY_CONFIG["PREFILTER_COOLDOWN"]
+    )
+
+# Firebase、回寫器與即時訂閱在 start_server 時才初始化 (見 init_services)
+db = None
+result_writer = None
+subscription_manager = None
 
 # ==========================================
-# 2. 金融工程核心 (向量化極速引擎)
+# 2. 金融工程核心 (向量化極速引擎)：見 pricing.py
 # ==========================================
-class VectorizedEngine:
-    @staticmethod
-    def bs_price_scalar(sigma, S, K, T, r, option_type='call'):
-        try:
-            if T <= 0: return max(0, S - K) if option_type == 'call' else max(0, K - S)
-            if sigma <= 0.0001: return max(0, S - K) if option_type == 'call' else max(0, K - S)
-            d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-            d2 = d1 - sigma * np.sqrt(T)
-            if option_type == 'call':
-                return S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-            else:
-                return K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        except:
-            return 0
-
-    @staticmethod
-    def implied_volatility_scalar(price, S, K, T, r, option_type='call'):
-        try:
-            intrinsic = max(0, S - K) if option_type == 'call' else max(0, K - S)
-            if price <= intrinsic + 0.001: return np.nan
-            def objective(sigma):
-                return VectorizedEngine.bs_price_scalar(sigma, S, K, T, r, option_type) - price
-            return brentq(objective, 0.01, 5.0)
-        except:
-            return np.nan
-
-    @staticmethod
-    def calculate_greeks_analytical_batch(S_arr, K_arr, T_arr, r, sigma_arr, types_arr):
-        sigma_arr = np.maximum(sigma_arr, 0.0001)
-        T_arr = np.maximum(T_arr, 0.00001)
-        d1 = (np.log(S_arr / K_arr) + (r + 0.5 * sigma_arr ** 2) * T_arr) / (sigma_arr * np.sqrt(T_arr))
-        d2 = d1 - sigma_arr * np.sqrt(T_arr)
-        pdf_d1 = norm.pdf(d1)
-        cdf_d1 = norm.cdf(d1)
-        cdf_minus_d1 = norm.cdf(-d1)
-        cdf_minus_d2 = norm.cdf(-d2)
-        cdf_d2 = norm.cdf(d2) 
-        delta_calls = cdf_d1
-        delta_puts = cdf_d1 - 1.0
-        deltas = np.where(types_arr == 'call', delta_calls, delta_puts)
-        term1 = -(S_arr * sigma_arr * pdf_d1) / (2 * np.sqrt(T_arr))
-        theta_calls = term1 - r * K_arr * np.exp(-r * T_arr) * cdf_d2
-        theta_puts = term1 + r * K_arr * np.exp(-r * T_arr) * cdf_minus_d2
-        thetas_annual = np.where(types_arr == 'call', theta_calls, theta_puts)
-        return deltas, thetas_annual
 
 # ==========================================
 # 3. 索引建立
@@ -223,13 +188,12 @@ class VectorizedEngine:
 def build_contract_index():
     print("📥 建立全市場索引 (含ETF)...")
     global api
-    global ALL_WARRANTS, STOCK_CODE_TO_NAME, STOCK_NAME_TO_CODE
+    global STOCK_CODE_TO_NAME, STOCK_NAME_TO_CODE
     
     # 確保 API 有連線
     if not api: init_api()
     
     # 清空舊資料
-    ALL_WARRANTS = []
     STOCK_CODE_TO_NAME = {}
     STOCK_NAME_TO_CODE = {}
     
@@ -242,33 +206,25 @@ def build_contract_index():
         tse = list(api.Contracts.Stocks.TSE) if hasattr(api.Contracts.Stocks, 'TSE') else []
         otc = list(api.Contracts.Stocks.OTC) if hasattr(api.Contracts.Stocks, 'OTC') else []
 
+    # 只記錄代號，不保留合約物件；權證本身不列入標的名稱對照表
+    warrant_codes = []
     for c in tse + otc:
+        if c.code in SPEC_STORE:
+            warrant_codes.append(c.code)
+            continue
         STOCK_CODE_TO_NAME[c.code] = c.name
         STOCK_NAME_TO_CODE[c.name] = c.code
-        if c.code in CACHE_SPECS:
-            ALL_WARRANTS.append(c)
-    print(f"🗺️ 索引完成！含 {len(ALL_WARRANTS)} 檔有效權證。")
+    count = SPEC_STORE.mark_tradable(warrant_codes)
+    print(f"🗺️ 索引完成！含 {count} 檔有效權證。")
 
 # ==========================================
 # 4. 搜尋與運算主邏輯 (含重試機制)
 # ==========================================
-def process_search(query_text):
-    global api
-    print(f"\n🔔 [Firebase] 收到搜尋請求：{query_text}")
-    
-    # === 步驟 0: API 健康檢查 ===
-    if not api:
-        print("⚠️ API 尚未連線，嘗試連線中...")
-        if not init_api():
-            print("❌ 無法連線，放棄本次搜尋")
-            return []
-
-    query_str = str(query_text).strip().replace("*", "")
-    
+def resolve_underlying(query_str):
+    """標的代碼識別，回傳 (代碼, 名稱)；找不到時代碼為 None"""
     mother_name = query_str
     mother_code = None
 
-    # === 標的代碼識別 ===
     if query_str in ["001", "大盤", "臺股指", "台股指", "加權"]:
         print("   🔍 識別為大盤指數搜尋！")
         mother_code = "001"
@@ -285,57 +241,52 @@ def process_search(query_text):
                 mother_name = name
                 mother_code = code
                 break
-    
-    if not mother_code:
-        print(f"   ❌ 找不到此股票代號: {query_str}")
-        return []
-
-    print(f"   🔍 正在抓取標的 ({mother_name}) 即時報價...")
-    mother_price = 0.0
-    
-    # === 抓取標的報價 (強化重試邏輯) ===
-    retry_count = 0
-    max_retries = 3
-    while retry_count < max_retries:
-        try:
-            if mother_code == "001":
-                m_contract = api.Contracts.Indexs.TSE.get("001")
-            else:
-                m_contract = api.Contracts.Stocks.TSE.get(mother_code)
-                if not m_contract:
-                    m_contract = api.Contracts.Stocks.OTC.get(mother_code)
-            
-            if m_contract:
-                s = api.snapshots([m_contract])
-                if s and len(s) > 0 and s[0].close > 0: 
-                    mother_price = float(s[0].close)
-                    print(f"   📊 標的價格: {mother_price}")
-                    break
-                else:
-                    raise ValueError("Snapshot empty or invalid")
-            else:
-                print(f"   ❌ 找不到合約物件: {mother_code}")
-                break
-                
-        except Exception as e:
-            retry_count += 1
-            print(f"   ⚠️ 標的報價抓取失敗 (嘗試 {retry_count}/{max_retries}): {e}")
-            
-            # 偵測到 Not ready 或 Timeout，執行重連
-            if "Not ready" in str(e) or "102949866" in str(e) or "timeout" in str(e).lower():
-                print("   🔌 偵測到連線問題，執行重連...")
-                init_api() 
-                time.sleep(3)
-            else:
-                time.sleep(2)
-
-    if mother_price <= 0:
-        print("   ⚠️ 標的無價格，無法計算。")
-        return []
+    return mother_code, mother_name
+
+def get_stock_contract(code):
+    """依代號取得合約物件 (只在抓報價時才建立，用完即丟)"""
+    contract = api.Contracts.Stocks.TSE.get(code)
+    if not contract:
+        contract = api.Contracts.Stocks.OTC.get(code)
+    return contract
+
+def get_underlying_contract(mother_code):
+    if mother_code == "001":
+        return api.Contracts.Indexs.TSE.get("001")
+    return get_stock_contract(mother_code)
+
+def fetch_underlying_prices(underlyings, priority=PRIORITY_INTERACTIVE):
+    """
+    透過報價排程器抓取所有標的報價 (限流、重試與重連由排程器處理)。
+    underlyings: [(代碼, 名稱), ...]；回傳 {代碼: 價格}，抓不到的標的不會出現在結果中。
+    """
+    names = "、".join(name for _, name in underlyings)
+    print(f"   🔍 正在抓取標的 ({names}) 即時報價...")
+    prices = {}
+    contracts = []
+    for code, _ in underlyings:
+        m_contract = get_underlying_contract(code)
+        if m_contract:
+            contracts.append(m_contract)
+        else:
+            print(f"   ❌ 找不到合約物件: {code}")
+
+    # 價格為 0 (剛開盤尚未成交) 的標的再查一次
+    for attempt in range(SNAPSHOT_CONFIG["MAX_ATTEMPTS"]):
+        snaps, _ = snapshot_scheduler.fetch(contracts, priority, timeout=SNAPSHOT_CONFIG["FETCH_TIMEOUT"])
+        for code, s in snaps.items():
+            if s.close > 0:
+                prices[code] = float(s.close)
+                print(f"   📊 標的價格 {code}: {prices[code]}")
+        contracts = [c for c in contracts if c.code not in prices]
+        if not contracts:
+            break
+        print(f"   ⚠️ 標的報價無效 (嘗試 {attempt + 1}/{SNAPSHOT_CONFIG['MAX_ATTEMPTS']}): "
+              f"{', '.join(c.code for c in contracts)}")
+    return prices
 
-    # =========================================
-    # 搜尋關鍵字邏輯
-    # =========================================
+def build_search_name(mother_code, mother_name):
+    """權證名稱搜尋關鍵字，回傳 (關鍵字, 是否為精準對應)"""
     search_name = ""
     is_custom_mapped = False 
     
@@ -359,178 +310,328 @@ def process_search(query_text):
         search_name = search_name.strip()
 
     print(f"   🕵️ 最終搜尋關鍵字: {search_name}")
+    return search_name, is_custom_mapped
 
-    target_warrants = []
-    for w in ALL_WARRANTS:
-        if search_name in w.name:
-            if STRATEGY_CONFIG["EXCLUDE_BROKER"] in w.name:
-                continue 
-            target_warrants.append(w)
+def select_target_warrants(search_name, is_custom_mapped, exclude_brokers):
+    """依關鍵字挑出權證列號，exclude_brokers 為可在此階段先排除的券商"""
+    target_rows = SPEC_STORE.find(search_name, exclude_brokers)
         
-    if not target_warrants:
+    if not len(target_rows):
         print(f"   ⚠️ 找不到權證 (關鍵字: {search_name})")
         if not is_custom_mapped and "台灣50" in search_name:
              fallback = search_name.replace("台灣50", "台50")
              print(f"   🔄 嘗試備用關鍵字: {fallback}")
-             for w in ALL_WARRANTS:
-                if fallback in w.name and STRATEGY_CONFIG["EXCLUDE_BROKER"] not in w.name:
-                    target_warrants.append(w)
-
-    if not target_warrants:
-        print("   ❌ 真的找不到，請確認該 ETF 是否有發行權證。")
-        return []
-
-    print(f"   📋 初步鎖定 {len(target_warrants)} 檔權證，進行運算...")
-
-    # --- 階段一：批次抓取與基礎過濾 ---
-    valid_candidates = []
-    chunk_size = 200
+             target_rows = SPEC_STORE.find(fallback, exclude_brokers)
+    return target_rows
+
+def fetch_warrant_snapshots(codes, priority=PRIORITY_INTERACTIVE):
+    """
+    權證報價抓取，交給全域報價排程器 (切 chunk、限流、重試、與其他搜尋合併)；
+    回傳 ({代號: snapshot}, 放棄的代號集合)，放棄代表出錯或逾時、沒有得到券商回應。
+    """
+    contracts = [get_stock_contract(code) for code in codes]
+    return snapshot_scheduler.fetch(contracts, priority, timeout=SNAPSHOT_CONFIG["FETCH_TIMEOUT"])
+
+def compute_warrant_table(target_rows, u_index, u_codes, u_prices, bounds, priority=PRIORITY_INTERACTIVE):
+    """
+    抓報價、算 IV 與 Greeks，產生共用的欄式運算表。
+    target_rows 為 SPEC_STORE 列號，與 u_index 等長，u_index 指向 u_codes / u_prices 中對應的標的；
+    bounds 為第一階段 (算 IV 前) 的最寬鬆篩選條件。
+    回傳 (table, 列數, reasons)：table 只含 IV 有解的列，"u" 欄為標的索引、"row" 欄為規格列號、
+    "src" 欄為在 target_rows 中的位置；reasons 為與 target_rows 等長的原因碼 (見 diagnostics.py)。
+    """
+    store = SPEC_STORE
+    target_rows = np.asarray(target_rows, dtype=np.intp)
+    u_index = np.asarray(u_index, dtype=np.intp)
+    count = len(target_rows)
+    reasons = np.zeros(count, dtype=np.uint8)
+
+    def drop(cond, code):
+        reasons[(reasons == REASON_OK) & cond] = code
+
+    # --- 階段零：只看規格就能判斷的條件、近期反覆沒有行情的列，都不抓報價 ---
+    Days_arr = store.maturity_epoch[target_rows] - to_epoch_day(datetime.date.today())  # 日曆天 (顯示與 MIN_DAYS_LEFT 用)
+    min_days = bounds.get("MIN_DAYS_LEFT")
+    drop(Days_arr <= 0, REASON_EXPIRY)
+    if min_days is not None: drop(Days_arr < min_days, REASON_EXPIRY)
+    drop(QUOTE_HEALTH.skipped(target_rows), REASON_PREFILTERED)
+    fetch = np.flatnonzero(reasons == REASON_OK)
+
+    # 同一檔權證被多個標的選中時只抓一次報價
+    snap_map, gave_up = fetch_warrant_snapshots(store.codes[np.unique(target_rows[fetch])].tolist(), priority)
+
+    # --- 階段一：報價填入欄式陣列 ---
+    Bid_arr = np.zeros(count)
+    Ask_arr = np.zeros(count)
+    Last_arr = np.zeros(count)
+    BidVol_arr = np.zeros(count)
+    AskVol_arr = np.zeros(count)
+    Vol_arr = np.zeros(count)
     
-    for i in range(0, len(target_warrants), chunk_size):
-        chunk = target_warrants[i:i+chunk_size]
-        
-        # === 權證報價抓取 (含容錯) ===
-        snapshots = []
-        snap_retry = 0
-        while snap_retry < 3:
-            try:
-                snapshots = api.snapshots(chunk)
-                break
-            except Exception as e:
-                print(f"   ⚠️ 權證報價抓取失敗，重試中... ({e})")
-                if "Not ready" in str(e):
-                    init_api()
-                    time.sleep(3)
-                snap_retry += 1
-                time.sleep(1)
-        
-        if not snapshots: continue # 真的抓不到就跳過這批
-
-        snap_map = {s.code: s for s in snapshots}
-        
-        for c in chunk:
-            if c.code not in snap_map: continue
-            if c.code not in CACHE_SPECS: continue
-            
-            snap = snap_map[c.code]
-            
-            try:
-                best_bid = float(snap.buy_price)
-                best_ask = float(snap.sell_price)
-                last_price = float(snap.close)
-                best_bid_vol = int(snap.buy_volume)
-                best_ask_vol = int(snap.sell_volume)
-                volume = int(snap.total_volume)
-                
-                if best_ask > 0 and best_bid > 0:
-                    spread = best_ask - best_bid
-                    if spread > STRATEGY_CONFIG["MAX_SPREAD"]: continue
-                
-                if best_ask > 0: market_price = best_ask
-                elif last_price > 0: market_price = last_price
-                elif best_bid > 0: market_price = best_bid
-                else: continue
-                
-                if volume < STRATEGY_CONFIG["MIN_VOLUME"]: continue
-                if market_price < STRATEGY_CONFIG["MIN_PRICE"] or market_price > STRATEGY_CONFIG["MAX_PRICE"]: continue
-
-                specs = CACHE_SPECS[c.code]
-                m_date = datetime.datetime.strptime(specs['maturity_date'], "%Y-%m-%d").date()
-                days_left = (m_date - datetime.date.today()).days
-                
-                if days_left < STRATEGY_CONFIG["MIN_DAYS_LEFT"]: continue
-                
-                valid_candidates.append({
-                    "contract": c,
-                    "market_price": market_price,
-                    "strike": specs['strike_price'],
-                    "multiplier": specs['multiplier'],
-                    "days_left": days_left,
-                    "type": specs['type'],
-                    "best_bid": best_bid,
-                    "best_ask": best_ask,
-                    "bid_vol": best_bid_vol,
-                    "ask_vol": best_ask_vol,
-                    "volume": volume
-                })
-            except Exception as e:
-                continue
-
-    if not valid_candidates:
-        print("   ⚠️ 基礎篩選後無符合資料")
-        return []
-
-    # --- 階段二：向量化運算 (Vectorized Greeks) ---
-    count = len(valid_candidates)
-    S_arr = np.full(count, mother_price)
-    K_arr = np.array([x['strike'] for x in valid_candidates])
-    T_arr = np.array([x['days_left'] for x in valid_candidates]) / 365.0
-    Price_arr = np.array([x['market_price'] for x in valid_candidates])
-    Mul_arr = np.array([x['multiplier'] for x in valid_candidates])
-    Type_arr = np.array([x['type'] for x in valid_candidates])
+    codes = store.codes[target_rows].tolist()
+    for k in fetch.tolist():
+        snap = snap_map.get(codes[k])
+        if snap is None:
+            reasons[k] = REASON_FETCH_FAILED if codes[k] in gave_up else REASON_NO_QUOTE
+            continue
+        try:
+            Bid_arr[k] = float(snap.buy_price)
+            Ask_arr[k] = float(snap.sell_price)
+            Last_arr[k] = float(snap.close)
+            BidVol_arr[k] = int(snap.buy_volume)
+            AskVol_arr[k] = int(snap.sell_volume)
+            Vol_arr[k] = int(snap.total_volume)
+        except (TypeError, ValueError, AttributeError):
+            reasons[k] = REASON_BAD_QUOTE
+
+    # --- 基礎過濾 (向量化) ---
+    Price_arr = np.where(Ask_arr > 0, Ask_arr, np.where(Last_arr > 0, Last_arr, Bid_arr))
+    drop(~(Price_arr > 0), REASON_NO_PRICE)
+    # 沒有行情的紀錄只看與篩選參數無關的結果；抓取失敗 (連線問題) 不算這檔沒有行情
+    answered = fetch[reasons[fetch] != REASON_FETCH_FAILED]
+    QUOTE_HEALTH.record(target_rows[answered], reasons[answered])
     
-    Unit_Price_arr = np.where(Mul_arr > 0, Price_arr / Mul_arr, Price_arr)
+    max_spread = bounds.get("MAX_SPREAD")
+    min_volume = bounds.get("MIN_VOLUME")
+    min_price = bounds.get("MIN_PRICE")
+    max_price = bounds.get("MAX_PRICE")
+    if max_spread is not None:
+        drop((Ask_arr > 0) & (Bid_arr > 0) & (Ask_arr - Bid_arr > max_spread), REASON_SPREAD)
+    if min_volume is not None: drop(~(Vol_arr >= min_volume), REASON_LOW_VOLUME)
+    if min_price is not None: drop(~(Price_arr >= min_price), REASON_PRICE_BAND)
+    if max_price is not None: drop(~(Price_arr <= max_price), REASON_PRICE_BAND)
+
+    cand = np.flatnonzero(reasons == REASON_OK)
+    if not len(cand):
+        return None, 0, reasons
+
+    # --- 階段二：向量化運算 (所有標的一次算完 IV 與 Greeks) ---
+    rows = target_rows[cand]
+    U_arr = u_index[cand]
+    S_arr = np.asarray(u_prices, dtype=float)[U_arr]
+    K_arr = store.strike[rows]
+    Mat_arr = store.maturity_epoch[rows]
+    # T 以剩餘交易日計 (交易日曆查表)，與下方 theta / 252 的單位一致
+    _, T_arr = get_trading_calendar().time_to_maturity(Mat_arr)
+    Price_arr = Price_arr[cand]
+    Mul_arr = store.multiplier[rows]
+    Type_arr = np.where(store.is_call[rows], 'call', 'put')
     
-    r_rate = 0.016
-    IV_list = []
+    Unit_Price_arr = np.where(Mul_arr > 0, Price_arr / Mul_arr, Price_arr)
     
-    for i in range(count):
-        iv = VectorizedEngine.implied_volatility_scalar(
-            Unit_Price_arr[i], S_arr[i], K_arr[i], T_arr[i], r_rate, Type_arr[i]
-        )
-        IV_list.append(iv)
+    # 持有成本：利率依期間內插、q 依標的查表、現金股利以 escrowed 模型自 S 扣除現值
+    carry = CARRY_STORE.get()
+    codes = np.asarray(u_codes, dtype=object)[U_arr]
+    R_arr = carry.rate_for(T_arr)
+    Q_arr = carry.yield_for(codes)
+    Sadj_arr = S_arr - carry.pv_dividends(codes, Mat_arr, R_arr)
     
-    IV_arr = np.array(IV_list)
-    valid_mask = ~np.isnan(IV_arr)
+    IV_arr = VectorizedEngine.implied_volatility_batch(Unit_Price_arr, Sadj_arr, K_arr, T_arr, R_arr, Type_arr, q=Q_arr)
+    idx = np.flatnonzero(~np.isnan(IV_arr))
+
+    # IV 無解的原因：到期、價格不高於內含價值 (與 implied_volatility_batch 相同判斷)、或區間內無解
+    failed = np.isnan(IV_arr)
+    intrinsic = np.where(Type_arr == 'call', np.maximum(Sadj_arr - K_arr, 0), np.maximum(K_arr - Sadj_arr, 0))
+    reasons[cand[failed]] = np.select(
+        [~(T_arr[failed] > 0), Unit_Price_arr[failed] <= intrinsic[failed] + 0.001],
+        [REASON_EXPIRY, REASON_BELOW_INTRINSIC],
+        REASON_IV_NO_CONVERGE
+    )
     
     deltas, thetas_annual = VectorizedEngine.calculate_greeks_analytical_batch(
-        S_arr, K_arr, T_arr, r_rate, IV_arr, Type_arr
+        Sadj_arr[idx], K_arr[idx], T_arr[idx], R_arr[idx], IV_arr[idx], Type_arr[idx], q=Q_arr[idx]
     )
     
+    # --- 階段三：衍生指標 (只算 IV 有解的列) ---
+    sel = cand[idx]
+    rows, U_arr, S_arr, K_arr, Price_arr, Mul_arr, IV_arr = rows[idx], U_arr[idx], S_arr[idx], K_arr[idx], Price_arr[idx], Mul_arr[idx], IV_arr[idx]
+    Bid_arr, Ask_arr = Bid_arr[sel], Ask_arr[sel]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lev_arr = (S_arr * np.abs(deltas) * Mul_arr) / Price_arr
+        theta_dollar_day = (thetas_annual / TRADING_DAYS_PER_YEAR) * Mul_arr
+        calc_base = np.where(Bid_arr > 0, Bid_arr, Price_arr)
+        theta_pct_arr = np.where(calc_base > 0, np.abs(theta_dollar_day) / calc_base * 100, 999)
+    
+    table = {
+        "u": U_arr,
+        "row": rows,
+        "src": sel,
+        "id": store.codes[rows],
+        "name": store.names[rows],
+        "price": Price_arr,
+        "bid": Bid_arr,
+        "ask": Ask_arr,
+        "spread": np.where((Ask_arr > 0) & (Bid_arr > 0), Ask_arr - Bid_arr, 0),
+        "bid_vol": BidVol_arr[sel],
+        "ask_vol": AskVol_arr[sel],
+        "volume": Vol_arr[sel],
+        "lev": lev_arr,
+        "theta_pct": theta_pct_arr,
+        "days": Days_arr[sel].astype(float),
+        "strike": K_arr,
+        "iv": IV_arr * 100,
+    }
+    return table, len(rows), reasons
+
+def take_rows(table, idx):
+    """從欄式運算表取出部分列"""
+    return {k: v[idx] for k, v in table.items()}
+
+def serialize_rows(table, indices):
+    """只把排名內的列轉成回傳用的 dict"""
     final_results = []
-    for i in range(count):
-        if not valid_mask[i]: continue 
-        
-        lev = (S_arr[i] * abs(deltas[i]) * Mul_arr[i]) / Price_arr[i]
-        theta_dollar_day = (thetas_annual[i] / 252.0) * Mul_arr[i]
-        
-        calc_base = valid_candidates[i]['best_bid'] if valid_candidates[i]['best_bid'] > 0 else Price_arr[i]
-        theta_pct = (abs(theta_dollar_day) / calc_base) * 100 if calc_base > 0 else 999
-        
-        if lev < STRATEGY_CONFIG["MIN_LEVERAGE"] or lev > STRATEGY_CONFIG["MAX_LEVERAGE"]: continue
-        if abs(theta_pct) > STRATEGY_CONFIG["MAX_THETA_PCT"]: continue
-        
-        c_info = valid_candidates[i]
-        contract = c_info['contract']
-        
+    for i in indices:
+        name = str(table['name'][i])
         broker_name = "其他"
         for b in KNOWN_BROKERS:
-            if b in contract.name:
+            if b in name:
                 broker_name = b
                 break
         
         final_results.append({
-            "id": contract.code,
-            "name": contract.name,
-            "price": round(float(c_info['market_price']), 2),
-            "bid": round(float(c_info['best_bid']), 2),
-            "ask": round(float(c_info['best_ask']), 2),
-            "spread": round(c_info['best_ask'] - c_info['best_bid'], 2) if (c_info['best_ask']>0 and c_info['best_bid']>0) else 0,
-            "bid_vol": c_info['bid_vol'],
-            "ask_vol": c_info['ask_vol'],
-            "volume": c_info['volume'],
-            "lev": round(float(lev), 2),
-            "theta_pct": round(float(theta_pct), 3),
-            "days": int(c_info['days_left']),
-            "strike": float(c_info['strike']),
-            "iv": round(float(IV_arr[i] * 100), 1),
+            "id": str(table['id'][i]),
+            "name": name,
+            "price": round(float(table['price'][i]), 2),
+            "bid": round(float(table['bid'][i]), 2),
+            "ask": round(float(table['ask'][i]), 2),
+            "spread": round(float(table['spread'][i]), 2),
+            "bid_vol": int(table['bid_vol'][i]),
+            "ask_vol": int(table['ask_vol'][i]),
+            "volume": int(table['volume'][i]),
+            "lev": round(float(table['lev'][i]), 2),
+            "theta_pct": round(float(table['theta_pct'][i]), 3),
+            "days": int(table['days'][i]),
+            "strike": float(table['strike'][i]),
+            "iv": round(float(table['iv'][i]), 1),
             "broker": broker_name,
         })
+    return final_results
 
-    final_results.sort(key=lambda x: x['volume'], reverse=True)
+def search_underlyings(queries, profiles, priority=PRIORITY_INTERACTIVE):
+    """
+    搜尋核心：多個標的 x 多組 (篩選管線, 排序)，共用一次報價抓取與一次 IV/Greeks 運算。
+    priority 為報價排程優先權 (前端指令為互動，即時訂閱推送為背景)。
+    回傳 (underlyings, results, diagnostics)：underlyings[q] 為 (代碼, 名稱) 或 None，
+    results[p][q] 為第 p 組條件在第 q 個查詢的結果清單，
+    diagnostics[p][q] 為 {"scanned": 候選數, "matched": 符合數, "drops": {原因: 剔除筆數}}。
+    """
+    global api
+    results = [[[] for _ in queries] for _ in profiles]
+    diagnostics = [[{"scanned": 0, "matched": 0, "drops": {}} for _ in queries] for _ in profiles]
+    underlyings = [None for _ in queries]
+    QUOTE_HEALTH.add_search(len(profiles))
 
-    print(f"   ✅ 計算完成！找到 {len(final_results)} 檔優質權證")
-    return final_results
+    # === 步驟 0: API 健康檢查 ===
+    if not api:
+        print("⚠️ API 尚未連線，嘗試連線中...")
+        if not init_api():
+            print("❌ 無法連線，放棄本次搜尋")
+            return underlyings, results, diagnostics
+
+    # === 標的代碼識別 (重複的標的只算一次) ===
+    resolved = {}
+    for q, query_text in enumerate(queries):
+        query_str = str(query_text).strip().replace("*", "")
+        mother_code, mother_name = resolve_underlying(query_str)
+        if not mother_code:
+            print(f"   ❌ 找不到此股票代號: {query_str}")
+            continue
+        underlyings[q] = (mother_code, mother_name)
+        resolved.setdefault(mother_code, mother_name)
+
+    if not resolved:
+        return underlyings, results, diagnostics
+
+    prices = fetch_underlying_prices(list(resolved.items()), priority)
+    for code in resolved:
+        if prices.get(code, 0) <= 0:
+            print(f"   ⚠️ 標的 {code} 無價格，無法計算。")
+
+    # === 挑選各標的權證，合併成一份清單 ===
+    bounds = merge_prefilter([pipeline for pipeline, _ in profiles])
+    u_codes = [code for code in resolved if prices.get(code, 0) > 0]
+    target_rows = []
+    u_index = []
+    for u, code in enumerate(u_codes):
+        search_name, is_custom_mapped = build_search_name(code, resolved[code])
+        found = select_target_warrants(search_name, is_custom_mapped, bounds["EXCLUDE_BROKER"])
+        if not len(found):
+            print(f"   ❌ 真的找不到 {code} 的權證，請確認該 ETF 是否有發行權證。")
+            continue
+        target_rows.append(found)
+        u_index.append(np.full(len(found), u, dtype=np.intp))
+
+    if not target_rows:
+        return underlyings, results, diagnostics
+
+    target_rows = np.concatenate(target_rows)
+    u_index = np.concatenate(u_index)
+    print(f"   📋 初步鎖定 {len(target_rows)} 檔權證 ({len(u_codes)} 個標的)，進行運算...")
+
+    table, count, reasons = compute_warrant_table(
+        target_rows, u_index, u_codes, [prices[c] for c in u_codes], bounds, priority
+    )
+    if not count:
+        print("   ⚠️ 基礎篩選後無符合資料")
+
+    # --- 階段四：各組條件只做遮罩、排序與序列化；每列的原因碼合併成剔除統計 ---
+    u_of_code = {code: u for u, code in enumerate(u_codes)}
+    for p, (pipeline, ranking) in enumerate(profiles):
+        codes = reasons.copy()
+        if count:
+            codes[table["src"]] = pipeline.reasons(table, count)
+            mask = codes[table["src"]] == REASON_OK
+        QUOTE_HEALTH.add_metrics(codes)
+        per_underlying = {}
+        for u in range(len(u_codes)):
+            in_u = u_index == u
+            if count:
+                idx = np.flatnonzero(mask & (table["u"] == u))
+                view = take_rows(table, idx)
+                order = rank_indices(view, ranking, len(idx))
+                rows = serialize_rows(view, order)
+            else:
+                idx, order, rows = (), (), []
+            drops = count_reasons(codes[in_u])
+            per_underlying[u] = (rows, {"scanned": int(in_u.sum()), "matched": len(idx), "drops": drops})
+            print(f"   ✅ {u_codes[u]} 計算完成！{len(idx)} 檔符合條件，回傳前 {len(order)} 檔")
+            print(f"   🧹 剔除原因: {format_reasons(drops)}")
+        for q, hit in enumerate(underlyings):
+            if hit and hit[0] in u_of_code:
+                results[p][q], diagnostics[p][q] = per_underlying[u_of_code[hit[0]]]
+    return underlyings, results, diagnostics
+
+def process_search_group(query_text, profiles, priority=PRIORITY_INTERACTIVE, with_diagnostics=False):
+    """
+    同一標的、多組 (篩選管線, 排序) 共用一次報價與 Greeks 運算。
+    profiles: [(FilterPipeline, ranking), ...]；回傳與 profiles 等長的結果清單。
+    with_diagnostics=True 時回傳 (結果清單, 剔除統計清單)。
+    """
+    print(f"\n🔔 [Firebase] 收到搜尋請求：{query_text} (共 {len(profiles)} 組條件)")
+    _, results, diagnostics = search_underlyings([query_text], profiles, priority)
+    results = [per_query[0] for per_query in results]
+    if with_diagnostics:
+        return results, [per_query[0] for per_query in diagnostics]
+    return results
+
+def process_batch_search(queries, ranking=None, filters=None):
+    """
+    多標的批次搜尋 (自選股清單)：所有標的共用一次 snapshots 與一次 IV/Greeks 運算。
+    回傳 [(查詢字串, 代碼, 名稱, 結果清單, 剔除統計), ...]，順序與 queries 相同。
+    """
+    print(f"\n🔔 [Firebase] 收到批次搜尋請求：{len(queries)} 個標的")
+    pipeline = compile_filters(filters, STRATEGY_CONFIG)
+    underlyings, results, diagnostics = search_underlyings(queries, [(pipeline, ranking)])
+    return [
+        (str(query), hit[0] if hit else None, hit[1] if hit else None, rows, diag)
+        for query, hit, rows, diag in zip(queries, underlyings, results[0], diagnostics[0])
+    ]
+
+def process_search(query_text, ranking=None, filters=None):
+    """單一搜尋；ranking 由 parse_ranking() 產生，filters 為覆寫 STRATEGY_CONFIG 的參數"""
+    pipeline = compile_filters(filters, STRATEGY_CONFIG)
+    return process_search_group(query_text, [(pipeline, ranking)])[0]
 
 # ==========================================
 # 5. Firebase 監聽與時程控制 (智慧排程核心)
@@ -540,41 +641,89 @@ def on_snapshot(col_snapshot, changes, read_time):
     if api is None:
         return
 
+    # 同一標的的待處理指令合併成一組，共用一次報價與 Greeks 運算
+    groups = {}
     for change in changes:
+        if change.type.name == 'MODIFIED':
+            data = change.document.to_dict()
+            if data.get('type') == 'subscribe' and data.get('status') == 'cancelled':
+                subscription_manager.remove(change.document.id)
+        if change.type.name == 'REMOVED':
+            # 文件被刪除：結束對應的訂閱 (不回寫狀態，文件已不存在)
+            subscription_manager.remove(change.document.id, status=None)
         if change.type.name == 'ADDED':
             doc = change.document
             data = doc.to_dict()
             if data.get('status') == 'pending':
+                if data.get('type') == 'batch':
+                    handle_batch_command(doc, data)
+                    continue
+                if data.get('type') == 'subscribe':
+                    handle_subscribe_command(doc, data)
+                    continue
+
                 query_text = data.get('stock_code') or data.get('query')
                 
                 if query_text:
-                    results = process_search(str(query_text))
-                    
-                    clean_results = []
-                    for item in results:
-                        clean_item = {}
-                        for k, v in item.items():
-                            if isinstance(v, (np.integer, np.int64)):
-                                clean_item[k] = int(v)
-                            elif isinstance(v, (np.floating, np.float64, np.float32)):
-                                clean_item[k] = float(v)
-                            else:
-                                clean_item[k] = v
-                        clean_results.append(clean_item)
-
-                    try:
-                        doc.reference.update({
-                            "status": "completed",
-                            "updatedAt": firestore.SERVER_TIMESTAMP,
-                            "count": len(clean_results),
-                            "data": clean_results
-                        })
-                        print(f"   ☁️ 成功！資料已回傳 (Doc ID: {doc.id})")
-                    except Exception as e:
-                        print(f"   ❌ 上傳失敗: {e}")
+                    groups.setdefault(str(query_text).strip(), []).append((doc, data))
+
+    for query_text, commands in groups.items():
+        profiles = [
+            (compile_filters(data.get('filters'), STRATEGY_CONFIG), parse_ranking(data))
+            for _, data in commands
+        ]
+        all_results, all_diagnostics = process_search_group(query_text, profiles, with_diagnostics=True)
+
+        for (doc, data), results, diag in zip(commands, all_results, all_diagnostics):
+            fmt = data.get('format') or RESULT_CONFIG["FORMAT"]
+            # 只有要求欄式格式的新版前端會讀 pages 子集合；逐列格式維持全部結果放在 data
+            paged = fmt == "columnar"
+            fields, extra_pages = build_result_payload(
+                results,
+                fmt=fmt,
+                page_size=RESULT_CONFIG["PAGE_SIZE"] if paged else 0,
+                max_pages=RESULT_CONFIG["MAX_PAGES"] if paged else 0
+            )
+            fields["diagnostics"] = diag
+            fields["updatedAt"] = firestore_service.server_timestamp()
+            result_writer.submit(doc.reference, fields, extra_pages)
+            print(f"   📤 結果已排入回寫佇列 (Doc ID: {doc.id})")
+
+def handle_batch_command(doc, data):
+    """批次搜尋指令：stock_codes 為標的清單，結果依標的分組寫回"""
+    queries = [str(q).strip() for q in (data.get('stock_codes') or []) if str(q).strip()]
+    if not queries:
+        print(f"   ⚠️ 批次指令沒有標的清單 (Doc ID: {doc.id})")
+        return
+
+    groups = process_batch_search(queries, parse_ranking(data), data.get('filters'))
+    fields, extra_pages = build_batch_payload(
+        groups,
+        fmt=data.get('format') or RESULT_CONFIG["FORMAT"],
+        max_rows=RESULT_CONFIG["PAGE_SIZE"],
+        max_doc_rows=RESULT_CONFIG["BATCH_DOC_ROWS"]
+    )
+    fields["updatedAt"] = firestore_service.server_timestamp()
+    result_writer.submit(doc.reference, fields, extra_pages)
+    print(f"   📤 批次結果已排入回寫佇列 (Doc ID: {doc.id})")
+
+def handle_subscribe_command(doc, data):
+    """即時訂閱指令：duration_sec 秒內 (或收盤前) 持續推送變動的列"""
+    query_text = data.get('stock_code') or data.get('query')
+    if not query_text:
+        return
+    try:
+        duration = float(data.get('duration_sec') or SUBSCRIPTION_CONFIG["DEFAULT_DURATION"])
+    except (TypeError, ValueError):
+        duration = SUBSCRIPTION_CONFIG["DEFAULT_DURATION"]
+    duration = min(max(duration, 0), SUBSCRIPTION_CONFIG["MAX_DURATION"])
+    subscription_manager.add(
+        doc.id, doc.reference, str(query_text).strip(),
+        compile_filters(data.get('filters'), STRATEGY_CONFIG), parse_ranking(data), duration
+    )
 
 def check_market_open():
-    """判斷是否為交易時間 (08:50 ~ 13:45)"""
+    """判斷是否為交易時間 (08:50 ~ 13:45，排除週末與休市日)"""
     now = datetime.datetime.now()
     current_time = now.time()
     
@@ -584,23 +733,60 @@ def check_market_open():
     if now.weekday() >= 5: # 週末
         return False, "週末休市"
 
+    if not get_trading_calendar().is_trading_day(now.date()):
+        return False, "國定假日休市"
+
     if start_time <= current_time <= end_time:
         return True, "開盤中"
     else:
         return False, "非交易時間"
 
+def init_services():
+    """連線 Firebase 並建立回寫器與即時訂閱管理；回傳 db (失敗為 None)"""
+    global db, result_writer, subscription_manager
+    if db is not None:
+        return db
+    db = firestore_service.get_db(CRED_PATH)
+    if not db:
+        return None
+
+    result_writer = ResultWriter(db, RESULT_CONFIG["BATCH_MAX"], RESULT_CONFIG["FLUSH_LINGER"])
+    subscription_manager = SubscriptionManager(
+        result_writer,
+        lambda query, profiles: process_search_group(query, profiles, PRIORITY_BACKGROUND),
+        lambda query: resolve_underlying(str(query).strip().replace("*", ""))[0],
+        check_market_open,
+        firestore_service.delete_field(),
+        firestore_service.server_timestamp(),
+        push_interval=SUBSCRIPTION_CONFIG["PUSH_INTERVAL"]
+    )
+    return db
+
+def log_metrics():
+    """輸出累計的搜尋次數與剔除原因 (開盤中定期呼叫，停止時再輸出一次)"""
+    metrics = QUOTE_HEALTH.metrics()
+    print(f"\n📊 累計 {metrics['searches']} 次搜尋 ({metrics['profiles']} 組條件)，"
+          f"冷卻中 {metrics['cooling']} 檔，剔除原因: {format_reasons(metrics['drops'])}")
+
 def start_server():
+    print("⚡ 正在啟動權證戰情室 (v2025.12.31 智慧排程版)...")
+
     # 第一次載入資料
     load_csv_data()
-    
-    print(f"📡 伺服器啟動成功！(智慧排程模式)")
+    get_trading_calendar()
     
     was_open = False 
+    last_metrics = time.time()
 
-    if not db:
+    if not init_services():
         print("❌ 無法連接 Firebase，請檢查 Key 設定。")
         return
 
+    print(f"📡 伺服器啟動成功！(智慧排程模式)")
+
+    result_writer.start()
+    snapshot_scheduler.start()
+    subscription_manager.start()
     col_ref = db.collection(COMMAND_COLLECTION)
     col_watch = col_ref.on_snapshot(on_snapshot)
     
@@ -622,7 +808,10 @@ def start_server():
                         print("❌ API 喚醒失敗，稍後重試...")
                         time.sleep(10)
                 
-                # 開盤中，讓主線程休息，由 on_snapshot 處理工作
+                # 開盤中，讓主線程休息，由 on_snapshot 處理工作；定期輸出累計統計
+                if time.time() - last_metrics >= QUALITY_CONFIG["METRICS_INTERVAL"]:
+                    log_metrics()
+                    last_metrics = time.time()
                 time.sleep(1) 
                 
             else:
@@ -643,6 +832,10 @@ def start_server():
 
         except KeyboardInterrupt:
             print("\n🛑 伺服器停止中...")
+            subscription_manager.stop()
+            snapshot_scheduler.stop()
+            result_writer.flush()
+            log_metrics()
             break
         except Exception as e:
             print(f"\n❌ 主迴圈錯誤: {e}")